@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
-import time, datetime, logging, pymysql, requests
+import time, datetime, logging, itertools, threading, pymysql
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tmdb_http import TmdbClient
 
 # --- LOGGING ---
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -10,33 +12,22 @@ TMDB_API_KEY = "bdeddfef8a400a117d24a8c6c6b99351"
 MYSQL_HOST, MYSQL_USER, MYSQL_PASS, MYSQL_PORT = "localhost", "dimme", "Telenet00", 3306
 DB_NAME = "thegame"
 
-HTTP_TIMEOUT = 30
-RETRIES = 3
-BACKOFF = 1.5
+# Titles fetched in parallel; the shared token bucket in tmdb_http (TMDB_RATE) caps the total request rate
+FETCH_WORKERS = 8
 
 # Limit how many people per title we enrich with extra headshot variants (keeps calls sane)
 MAX_CAST_PER_TITLE = 20
 MAX_DIRECTORS_PER_TITLE = 10
+MAX_HEADSHOTS_PER_TITLE = 10
+
+# People refreshed (people.checked_at) within this many days are not fetched again; 0 refreshes everyone
+PERSON_REFRESH_DAYS = 30
 
 # --- HTTP helpers ---
-SESSION = requests.Session()
-BASE = "https://api.themoviedb.org/3"
+CLIENT = TmdbClient(TMDB_API_KEY)
 
 def tmdb_get(path, params=None):
-    p = {"api_key": TMDB_API_KEY}
-    if params: p.update(params)
-    err = None
-    for attempt in range(1, RETRIES + 1):
-        try:
-            r = SESSION.get(f"{BASE}{path}", params=p, timeout=HTTP_TIMEOUT)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            err = e
-            wait = BACKOFF ** (attempt - 1)
-            log.warning("GET %s failed (attempt %d/%d): %s; retry in %.1fs", path, attempt, RETRIES, e, wait)
-            time.sleep(wait)
-    raise err
+    return CLIENT.get(path, params)
 
 # --- DB helpers ---
 def connect(db=None, autocommit=True):
@@ -100,7 +91,8 @@ CREATE TABLE IF NOT EXISTS movie_details (
   checked_at DATE NOT NULL,
   PRIMARY KEY (tmdb_id),
   KEY idx_imdb (imdb_id),
-  KEY idx_rel (release_date)
+  KEY idx_rel (release_date),
+  KEY idx_checked (checked_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 """
 DDL_MOVIE_GENRES = """
@@ -132,7 +124,8 @@ CREATE TABLE IF NOT EXISTS movie_images (
   vote_average DOUBLE NULL,
   vote_count INT NULL,
   PRIMARY KEY (tmdb_id, img_type, file_path),
-  KEY idx_size (width, height)
+  KEY idx_size (width, height),
+  KEY idx_backdrop_rank (tmdb_id, img_type, iso_639_1, vote_count, vote_average, width)  -- refresh-questions.py
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 """
 DDL_MOVIE_CAST = """
@@ -175,7 +168,8 @@ CREATE TABLE IF NOT EXISTS tv_details (
   checked_at DATE NOT NULL,
   PRIMARY KEY (tmdb_id),
   KEY idx_imdb (imdb_id),
-  KEY idx_first (first_air_date)
+  KEY idx_first (first_air_date),
+  KEY idx_checked (checked_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 """
 DDL_TV_GENRES = """
@@ -207,7 +201,8 @@ CREATE TABLE IF NOT EXISTS tv_images (
   vote_average DOUBLE NULL,
   vote_count INT NULL,
   PRIMARY KEY (tmdb_id, img_type, file_path),
-  KEY idx_size (width, height)
+  KEY idx_size (width, height),
+  KEY idx_backdrop_rank (tmdb_id, img_type, iso_639_1, vote_count, vote_average, width)  -- refresh-questions.py
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 """
 DDL_TV_CAST = """
@@ -253,11 +248,21 @@ ON DUPLICATE KEY UPDATE
  popularity=VALUES(popularity), vote_average=VALUES(vote_average), vote_count=VALUES(vote_count),
  revenue=VALUES(revenue), budget=VALUES(budget), checked_at=VALUES(checked_at);
 """
-UPSERT_MOVIE_GENRE = "INSERT IGNORE INTO movie_genres (tmdb_id, genre_id, genre_name) VALUES (%s,%s,%s);"
-UPSERT_MOVIE_COUNTRY = "INSERT IGNORE INTO movie_countries (tmdb_id, iso_3166_1, country_name) VALUES (%s,%s,%s);"
+# Child rows are only sent when new or changed (see sync_children), so these update in place.
+# executemany turns each of them into multi-row INSERTs.
+UPSERT_MOVIE_GENRE = """
+INSERT INTO movie_genres (tmdb_id, genre_id, genre_name) VALUES (%s,%s,%s)
+ON DUPLICATE KEY UPDATE genre_name=VALUES(genre_name);
+"""
+UPSERT_MOVIE_COUNTRY = """
+INSERT INTO movie_countries (tmdb_id, iso_3166_1, country_name) VALUES (%s,%s,%s)
+ON DUPLICATE KEY UPDATE country_name=VALUES(country_name);
+"""
 UPSERT_MOVIE_IMAGE = """
-INSERT IGNORE INTO movie_images (tmdb_id, img_type, file_path, width, height, iso_639_1, aspect_ratio, vote_average, vote_count)
-VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s);
+INSERT INTO movie_images (tmdb_id, img_type, file_path, width, height, iso_639_1, aspect_ratio, vote_average, vote_count)
+VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE width=VALUES(width), height=VALUES(height), iso_639_1=VALUES(iso_639_1),
+ aspect_ratio=VALUES(aspect_ratio), vote_average=VALUES(vote_average), vote_count=VALUES(vote_count);
 """
 UPSERT_MOVIE_CAST = """
 INSERT INTO movie_cast (tmdb_id, person_id, `order_in_cast`, character_name, popularity)
@@ -278,11 +283,19 @@ ON DUPLICATE KEY UPDATE
  original_language=VALUES(original_language), homepage=VALUES(homepage), status=VALUES(status), overview=VALUES(overview),
  popularity=VALUES(popularity), vote_average=VALUES(vote_average), vote_count=VALUES(vote_count), checked_at=VALUES(checked_at);
 """
-UPSERT_TV_GENRE = "INSERT IGNORE INTO tv_genres (tmdb_id, genre_id, genre_name) VALUES (%s,%s,%s);"
-UPSERT_TV_COUNTRY = "INSERT IGNORE INTO tv_countries (tmdb_id, iso_3166_1, country_name) VALUES (%s,%s,%s);"
+UPSERT_TV_GENRE = """
+INSERT INTO tv_genres (tmdb_id, genre_id, genre_name) VALUES (%s,%s,%s)
+ON DUPLICATE KEY UPDATE genre_name=VALUES(genre_name);
+"""
+UPSERT_TV_COUNTRY = """
+INSERT INTO tv_countries (tmdb_id, iso_3166_1, country_name) VALUES (%s,%s,%s)
+ON DUPLICATE KEY UPDATE country_name=VALUES(country_name);
+"""
 UPSERT_TV_IMAGE = """
-INSERT IGNORE INTO tv_images (tmdb_id, img_type, file_path, width, height, iso_639_1, aspect_ratio, vote_average, vote_count)
-VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s);
+INSERT INTO tv_images (tmdb_id, img_type, file_path, width, height, iso_639_1, aspect_ratio, vote_average, vote_count)
+VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE width=VALUES(width), height=VALUES(height), iso_639_1=VALUES(iso_639_1),
+ aspect_ratio=VALUES(aspect_ratio), vote_average=VALUES(vote_average), vote_count=VALUES(vote_count);
 """
 UPSERT_TV_CAST = """
 INSERT INTO tv_cast (tmdb_id, person_id, total_episode_count, popularity)
@@ -295,6 +308,23 @@ VALUES (%s,%s,%s)
 ON DUPLICATE KEY UPDATE total_episode_count=VALUES(total_episode_count);
 """
 
+# Per-title child tables: table -> (key columns after tmdb_id, value columns, upsert)
+CHILD_TABLES = {
+    "movie_genres": (("genre_id",), ("genre_name",), UPSERT_MOVIE_GENRE),
+    "movie_countries": (("iso_3166_1",), ("country_name",), UPSERT_MOVIE_COUNTRY),
+    "movie_images": (("img_type", "file_path"),
+                     ("width", "height", "iso_639_1", "aspect_ratio", "vote_average", "vote_count"), UPSERT_MOVIE_IMAGE),
+    "movie_cast": (("person_id",), ("order_in_cast", "character_name", "popularity"), UPSERT_MOVIE_CAST),
+    "movie_directors": (("person_id",), (), UPSERT_MOVIE_DIRECTOR),
+    "tv_genres": (("genre_id",), ("genre_name",), UPSERT_TV_GENRE),
+    "tv_countries": (("iso_3166_1",), ("country_name",), UPSERT_TV_COUNTRY),
+    "tv_images": (("img_type", "file_path"),
+                  ("width", "height", "iso_639_1", "aspect_ratio", "vote_average", "vote_count"), UPSERT_TV_IMAGE),
+    "tv_cast": (("person_id",), ("total_episode_count", "popularity"), UPSERT_TV_CAST),
+    "tv_directors": (("person_id",), ("total_episode_count",), UPSERT_TV_DIRECTOR),
+}
+DELETE_BATCH = 200
+
 def ensure_schema():
     with connect(db=None) as cnx, cnx.cursor() as cur:
         cur.execute(DDL)
@@ -307,26 +337,295 @@ def ensure_schema():
             cur.execute(ddl)
     log.info("Schema ensured.")
 
-def upsert_person(cur, person_id, name, profile_path, known_for_department, gender, popularity):
+# --- Fetch stage (worker threads, HTTP only) ---
+def select_movie_credits(data):
+    # (cast, directors) we store for a movie: actors & directors only
+    credits = data.get("credits") or {}
+    cast = credits.get("cast") or []
+    crew = credits.get("crew") or []
+    cast_sorted = sorted(cast, key=lambda x: (x.get("order", 9999), -(x.get("popularity") or 0)))[:MAX_CAST_PER_TITLE]
+    directors = [m for m in crew if (m.get("job") == "Director")][:MAX_DIRECTORS_PER_TITLE]
+    return cast_sorted, directors
+
+def select_tv_credits(data):
+    # (cast, directors) for a show from aggregate credits; directors carry their episode count
+    agg = data.get("aggregate_credits") or {}
+    cast = agg.get("cast") or []
+    crew = agg.get("crew") or []
+
+    cast_sorted = sorted(
+        cast, key=lambda x: (-(x.get("total_episode_count") or 0), -(x.get("popularity") or 0))
+    )[:MAX_CAST_PER_TITLE]
+
+    dirs = []
+    for member in crew:
+        jobs = member.get("jobs") or []
+        total_eps = 0
+        for j in jobs:
+            if (j.get("job") == "Director"):
+                total_eps += (j.get("episode_count") or 0)
+        if total_eps > 0:
+            m = dict(member)
+            m["_dir_episode_count"] = total_eps
+            dirs.append(m)
+    dirs = sorted(dirs, key=lambda m: -m["_dir_episode_count"])[:MAX_DIRECTORS_PER_TITLE]
+    return cast_sorted, dirs
+
+class PersonCache:
+    # Person lookups for one run, shared by movies and TV and by all fetch threads. People
+    # checked within PERSON_REFRESH_DAYS are served from the people table without any request;
+    # everyone else is fetched once, and threads asking for the same person wait for that fetch.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fresh = {}      # person_id -> imdb_id, from people.checked_at
+        self.entries = {}    # (kind, person_id) -> Future
+        self.hits = self.misses = self.skipped = 0
+
+    def seed(self, cur, days=PERSON_REFRESH_DAYS):
+        if days <= 0:
+            return
+        since = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+        cur.execute("SELECT person_id, imdb_id FROM people WHERE checked_at >= %s", (since,))
+        self.fresh = dict(cur.fetchall())
+        log.info("People checked within %d days (not fetched again): %d", days, len(self.fresh))
+
+    def is_fresh(self, person_id):
+        if person_id in self.fresh:
+            with self.lock:
+                self.skipped += 1
+            return True
+        return False
+
+    def lookup(self, kind, person_id, fetch):
+        # Returns (value, first): first is True for the one call that actually fetched
+        with self.lock:
+            future = self.entries.get((kind, person_id))
+            first = future is None
+            if first:
+                future = self.entries[(kind, person_id)] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if first:
+            try:
+                future.set_result(fetch())
+            except Exception as e:
+                # Not remembered: a later title asks again (offline misses and errors alike)
+                log.debug("person %s %s failed: %s", person_id, kind, e)
+                with self.lock:
+                    del self.entries[(kind, person_id)]
+                future.set_result(None)
+        return future.result(), first
+
+    def report(self):
+        total = self.hits + self.misses + self.skipped
+        log.info("Person lookups: %d, fetched %d, memo hits %d, skipped as fresh %d (%.0f%% saved)",
+                 total, self.misses, self.hits, self.skipped,
+                 100.0 * (self.hits + self.skipped) / total if total else 0)
+
+PEOPLE = PersonCache()
+
+def fetch_people(cast, directors):
+    # imdb ids for everyone we store, headshots for the first few cast members and the directors.
+    # Returns (imdb_ids, profiles, fresh): fresh people need no people/person_images writes,
+    # profiles only holds headshots not already written earlier in this run. People whose
+    # external_ids lookup failed are left out of imdb_ids, so their stored row is kept as is.
+    imdb_ids, profiles, fresh, failed = {}, {}, set(), set()
+    for p in cast + directors:
+        pid = p.get("id")
+        if pid in imdb_ids or pid in failed:
+            continue
+        if PEOPLE.is_fresh(pid):
+            imdb_ids[pid] = PEOPLE.fresh[pid]
+            fresh.add(pid)
+            continue
+        ext, _ = PEOPLE.lookup("external_ids", pid, lambda: tmdb_get(f"/person/{pid}/external_ids"))
+        if ext is None:
+            failed.add(pid)
+            continue
+        imdb_ids[pid] = ext.get("imdb_id")
+    for p in cast[:MAX_HEADSHOTS_PER_TITLE] + directors:
+        pid = p.get("id")
+        if pid in profiles or pid in fresh:
+            continue
+        imgs, first = PEOPLE.lookup("images", pid, lambda: tmdb_get(f"/person/{pid}/images"))
+        if first and imgs is not None:
+            profiles[pid] = imgs.get("profiles", []) or []
+    return imdb_ids, profiles, fresh
+
+def fetch_movie(tmdb_id):
+    data = tmdb_get(f"/movie/{tmdb_id}", {
+        "append_to_response": "images,credits,external_ids",
+        "include_image_language": "en,null"
+    })
+    cast, directors = select_movie_credits(data)
+    imdb_ids, profiles, fresh = fetch_people(cast, directors)
+    return {"data": data, "cast": cast, "directors": directors, "imdb_ids": imdb_ids, "profiles": profiles,
+            "fresh": fresh}
+
+def fetch_tv(tmdb_id):
+    data = tmdb_get(f"/tv/{tmdb_id}", {
+        "append_to_response": "images,external_ids,aggregate_credits",
+        "include_image_language": "en,null"
+    })
+    cast, directors = select_tv_credits(data)
+    imdb_ids, profiles, fresh = fetch_people(cast, directors)
+    return {"data": data, "cast": cast, "directors": directors, "imdb_ids": imdb_ids, "profiles": profiles,
+            "fresh": fresh}
+
+def fetch_all(ids, fetch):
+    # Runs fetch(id) on FETCH_WORKERS threads and yields (id, result, error) as titles finish.
+    # At most 2x FETCH_WORKERS titles are in flight, so fetched data never piles up ahead of the writer.
+    pending = iter(ids)
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        in_flight = {}
+
+        def fill():
+            for tmdb_id in itertools.islice(pending, FETCH_WORKERS * 2 - len(in_flight)):
+                in_flight[pool.submit(fetch, tmdb_id)] = tmdb_id
+
+        fill()
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                tmdb_id = in_flight.pop(future)
+                try:
+                    yield tmdb_id, future.result(), None
+                except Exception as e:
+                    yield tmdb_id, None, e
+            fill()
+
+# --- DB writer (main thread, one transaction per title) ---
+def sync_children(cur, table, tmdb_id, rows):
+    # rows: (keys..., values...) without tmdb_id, first one wins per key. Compared with what's
+    # stored: new or changed rows go out as one multi-row upsert, rows that disappeared are
+    # deleted by key, unchanged rows aren't touched. Returns (written, deleted).
+    keys, values, upsert = CHILD_TABLES[table]
+    n = len(keys)
+    cur.execute(f"SELECT {', '.join(f'`{c}`' for c in keys + values)} FROM {table} WHERE tmdb_id=%s", (tmdb_id,))
+    stored = {tuple(row[:n]): tuple(row[n:]) for row in cur.fetchall()}
+    wanted = {}
+    for row in rows:
+        wanted.setdefault(tuple(row[:n]), tuple(row[n:]))
+    changed = [(tmdb_id, *k, *v) for k, v in wanted.items() if stored.get(k) != v]
+    gone = [k for k in stored if k not in wanted]
+    match = "(" + " AND ".join(f"`{c}`=%s" for c in keys) + ")"
+    for i in range(0, len(gone), DELETE_BATCH):
+        chunk = gone[i:i + DELETE_BATCH]
+        cur.execute(f"DELETE FROM {table} WHERE tmdb_id=%s AND ({' OR '.join([match] * len(chunk))})",
+                    (tmdb_id, *itertools.chain.from_iterable(chunk)))
+    if changed:
+        cur.executemany(upsert, changed)
+    return len(changed), len(gone)
+
+def image_rows(images):
+    rows = []
+    for img_type, key in (("backdrop", "backdrops"), ("poster", "posters"), ("logo", "logos")):
+        for img in images.get(key, []) or []:
+            rows.append((img_type, img.get("file_path"), img.get("width"), img.get("height"), img.get("iso_639_1"),
+                         img.get("aspect_ratio"), img.get("vote_average"), img.get("vote_count")))
+    return rows
+
+def person_row(p, known_for_department, imdb_ids):
     checked_at = datetime.date.today().isoformat()
-    imdb_id = None
-    try:
-        ext = tmdb_get(f"/person/{person_id}/external_ids")
-        imdb_id = ext.get("imdb_id")
-    except Exception:
-        pass
-    cur.execute(UPSERT_PEOPLE, (person_id, imdb_id, (name or "")[:255], known_for_department, gender, popularity, profile_path, checked_at))
-
-def upsert_person_images(cur, person_id):
-    try:
-        imgs = tmdb_get(f"/person/{person_id}/images")
-        for p in imgs.get("profiles", []) or []:
-            cur.execute(UPSERT_PERSON_IMAGE, (
-                person_id, p.get("file_path"), p.get("width"), p.get("height"),
-                p.get("vote_average"), p.get("vote_count"), p.get("aspect_ratio")
-            ))
-    except Exception as e:
-        log.debug("person %s images failed: %s", person_id, e)
+    return (p.get("id"), imdb_ids.get(p.get("id")), (p.get("name") or "")[:255], known_for_department,
+            p.get("gender"), p.get("popularity"), p.get("profile_path"), checked_at)
+
+def write_people(cur, bundle, cast_department="Acting"):
+    # people rows for everyone looked up this run (one multi-row upsert), then the headshots fetched
+    # for this title. Failed lookups write no row: a NULL imdb_id and today's checked_at would wipe
+    # the stored id and keep the person from being looked up again for PERSON_REFRESH_DAYS.
+    fresh, imdb_ids = bundle["fresh"], bundle["imdb_ids"]
+    looked_up = imdb_ids.keys() - fresh
+    rows = [person_row(c, cast_department, imdb_ids) for c in bundle["cast"] if c.get("id") in looked_up]
+    rows += [person_row(d, d.get("known_for_department"), imdb_ids) for d in bundle["directors"] if d.get("id") in looked_up]
+    if rows:
+        cur.executemany(UPSERT_PEOPLE, rows)
+    images = [(pid, p.get("file_path"), p.get("width"), p.get("height"), p.get("vote_average"), p.get("vote_count"),
+               p.get("aspect_ratio")) for pid, profiles in bundle["profiles"].items() for p in profiles]
+    if images:
+        cur.executemany(UPSERT_PERSON_IMAGE, images)
+
+def write_movie(cur, tmdb_id, bundle):
+    data = bundle["data"]
+    checked_at = datetime.date.today().isoformat()
+    cur.execute(UPSERT_MOVIE_DETAILS, (
+        data.get("id"),
+        (data.get("external_ids") or {}).get("imdb_id"),
+        (data.get("title") or "")[:255],
+        (data.get("original_title") or "")[:255],
+        data.get("release_date") or None,
+        data.get("runtime"),
+        data.get("original_language"),
+        data.get("homepage"),
+        data.get("status"),
+        data.get("overview"),
+        data.get("popularity"),
+        data.get("vote_average"),
+        data.get("vote_count"),
+        data.get("revenue"),
+        data.get("budget"),
+        checked_at
+    ))
+    sync_children(cur, "movie_genres", tmdb_id, [(g.get("id"), g.get("name")) for g in data.get("genres", []) or []])
+    sync_children(cur, "movie_countries", tmdb_id,
+                  [(c.get("iso_3166_1"), c.get("name")) for c in data.get("production_countries", []) or []])
+    sync_children(cur, "movie_images", tmdb_id, image_rows(data.get("images") or {}))
+    # credits (actors & directors only)
+    write_people(cur, bundle)
+    sync_children(cur, "movie_cast", tmdb_id,
+                  [(c.get("id"), c.get("order"), c.get("character"), c.get("popularity")) for c in bundle["cast"]])
+    sync_children(cur, "movie_directors", tmdb_id, [(d.get("id"),) for d in bundle["directors"]])
+
+def write_tv(cur, tmdb_id, bundle):
+    data = bundle["data"]
+    checked_at = datetime.date.today().isoformat()
+    cur.execute(UPSERT_TV_DETAILS, (
+        data.get("id"),
+        (data.get("external_ids") or {}).get("imdb_id"),
+        (data.get("name") or "")[:255],
+        (data.get("original_name") or "")[:255],
+        data.get("first_air_date") or None,
+        data.get("last_air_date") or None,
+        data.get("number_of_seasons"),
+        data.get("number_of_episodes"),
+        data.get("original_language"),
+        data.get("homepage"),
+        data.get("status"),
+        data.get("overview"),
+        data.get("popularity"),
+        data.get("vote_average"),
+        data.get("vote_count"),
+        checked_at
+    ))
+    sync_children(cur, "tv_genres", tmdb_id, [(g.get("id"), g.get("name")) for g in data.get("genres", []) or []])
+    sync_children(cur, "tv_countries", tmdb_id, [(iso, iso) for iso in data.get("origin_country", []) or []])
+    sync_children(cur, "tv_images", tmdb_id, image_rows(data.get("images") or {}))
+    write_people(cur, bundle)
+    sync_children(cur, "tv_cast", tmdb_id,
+                  [(c.get("id"), c.get("total_episode_count"), c.get("popularity")) for c in bundle["cast"]])
+    sync_children(cur, "tv_directors", tmdb_id, [(d.get("id"), d["_dir_episode_count"]) for d in bundle["directors"]])
+
+def enrich(cnx, cur, label, kept, fetch, write):
+    # Fetch stage runs ahead on worker threads; this thread writes and commits each title
+    started, failed = time.monotonic(), 0
+    for i, (tmdb_id, bundle, err) in enumerate(fetch_all(kept, fetch), start=1):
+        if err is not None:
+            # No details row is written, so the next run picks this title up again
+            failed += 1
+            log.error("%s %s failed: %s", label, tmdb_id, err)
+        else:
+            try:
+                write(cur, tmdb_id, bundle)
+                cnx.commit()
+            except pymysql.MySQLError as e:
+                cnx.rollback()
+                failed += 1
+                log.error("%s %s DB write failed: %s", label, tmdb_id, e)
+        if i % 20 == 0 or i == len(kept):
+            log.info("%s processed %d/%d (%d failed), %.1f titles/s, %d requests, %d from cache, %d retries",
+                     label, i, len(kept), failed, i / max(time.monotonic() - started, 1e-6),
+                     CLIENT.requests, CLIENT.cached, CLIENT.retries)
 
 def process_movies():
     with connect(db=DB_NAME, autocommit=False) as cnx, cnx.cursor() as cur:
@@ -341,85 +640,7 @@ def process_movies():
         """)
         kept = [row[0] for row in cur.fetchall()]
         log.info("Movies needing enrichment (no details yet, vote_count>=100): %d", len(kept))
-
-        for i, tmdb_id in enumerate(kept, start=1):
-            data = tmdb_get(f"/movie/{tmdb_id}", {
-                "append_to_response": "images,credits,external_ids",
-                "include_image_language": "en,null"
-            })
-
-            checked_at = datetime.date.today().isoformat()
-            cur.execute(UPSERT_MOVIE_DETAILS, (
-                data.get("id"),
-                (data.get("external_ids") or {}).get("imdb_id"),
-                (data.get("title") or "")[:255],
-                (data.get("original_title") or "")[:255],
-                data.get("release_date") or None,
-                data.get("runtime"),
-                data.get("original_language"),
-                data.get("homepage"),
-                data.get("status"),
-                data.get("overview"),
-                data.get("popularity"),
-                data.get("vote_average"),
-                data.get("vote_count"),
-                data.get("revenue"),
-                data.get("budget"),
-                checked_at
-            ))
-
-            # genres
-            cur.execute("DELETE FROM movie_genres WHERE tmdb_id=%s", (tmdb_id,))
-            for g in data.get("genres", []) or []:
-                cur.execute(UPSERT_MOVIE_GENRE, (tmdb_id, g.get("id"), g.get("name")))
-
-            # production countries
-            cur.execute("DELETE FROM movie_countries WHERE tmdb_id=%s", (tmdb_id,))
-            for c in data.get("production_countries", []) or []:
-                cur.execute(UPSERT_MOVIE_COUNTRY, (tmdb_id, c.get("iso_3166_1"), c.get("name")))
-
-            # images
-            cur.execute("DELETE FROM movie_images WHERE tmdb_id=%s", (tmdb_id,))
-            images = data.get("images") or {}
-            for img in images.get("backdrops", []) or []:
-                cur.execute(UPSERT_MOVIE_IMAGE, (tmdb_id, "backdrop", img.get("file_path"),
-                                                 img.get("width"), img.get("height"), img.get("iso_639_1"),
-                                                 img.get("aspect_ratio"), img.get("vote_average"), img.get("vote_count")))
-            for img in images.get("posters", []) or []:
-                cur.execute(UPSERT_MOVIE_IMAGE, (tmdb_id, "poster", img.get("file_path"),
-                                                 img.get("width"), img.get("height"), img.get("iso_639_1"),
-                                                 img.get("aspect_ratio"), img.get("vote_average"), img.get("vote_count")))
-            for img in images.get("logos", []) or []:
-                cur.execute(UPSERT_MOVIE_IMAGE, (tmdb_id, "logo", img.get("file_path"),
-                                                 img.get("width"), img.get("height"), img.get("iso_639_1"),
-                                                 img.get("aspect_ratio"), img.get("vote_average"), img.get("vote_count")))
-
-            # credits (actors & directors only)
-            credits = data.get("credits") or {}
-            cast = credits.get("cast") or []
-            crew = credits.get("crew") or []
-
-            cast_sorted = sorted(cast, key=lambda x: (x.get("order", 9999), -(x.get("popularity") or 0)))[:MAX_CAST_PER_TITLE]
-            cur.execute("DELETE FROM movie_cast WHERE tmdb_id=%s", (tmdb_id,))
-            for c in cast_sorted:
-                pid = c.get("id")
-                upsert_person(cur, pid, c.get("name"), c.get("profile_path"), "Acting", c.get("gender"), c.get("popularity"))
-                cur.execute(UPSERT_MOVIE_CAST, (tmdb_id, pid, c.get("order"), c.get("character"), c.get("popularity")))
-
-            directors = [m for m in crew if (m.get("job") == "Director")][:MAX_DIRECTORS_PER_TITLE]
-            cur.execute("DELETE FROM movie_directors WHERE tmdb_id=%s", (tmdb_id,))
-            for d in directors:
-                pid = d.get("id")
-                upsert_person(cur, pid, d.get("name"), d.get("profile_path"), d.get("known_for_department"), d.get("gender"), d.get("popularity"))
-                cur.execute(UPSERT_MOVIE_DIRECTOR, (tmdb_id, pid))
-
-            for p in cast_sorted[:10] + directors:
-                upsert_person_images(cur, p.get("id"))
-
-            cnx.commit()
-            if i % 20 == 0 or i == len(kept):
-                log.info("Movies processed %d/%d", i, len(kept))
-            time.sleep(0.05)
+        enrich(cnx, cur, "Movies", kept, fetch_movie, write_movie)
 
 def process_tv():
     with connect(db=DB_NAME, autocommit=False) as cnx, cnx.cursor() as cur:
@@ -434,102 +655,17 @@ def process_tv():
         """)
         kept = [row[0] for row in cur.fetchall()]
         log.info("TV needing enrichment (no details yet, vote_count>=100): %d", len(kept))
-
-        for i, tmdb_id in enumerate(kept, start=1):
-            data = tmdb_get(f"/tv/{tmdb_id}", {
-                "append_to_response": "images,external_ids,aggregate_credits",
-                "include_image_language": "en,null"
-            })
-            checked_at = datetime.date.today().isoformat()
-
-            cur.execute(UPSERT_TV_DETAILS, (
-                data.get("id"),
-                (data.get("external_ids") or {}).get("imdb_id"),
-                (data.get("name") or "")[:255],
-                (data.get("original_name") or "")[:255],
-                data.get("first_air_date") or None,
-                data.get("last_air_date") or None,
-                data.get("number_of_seasons"),
-                data.get("number_of_episodes"),
-                data.get("original_language"),
-                data.get("homepage"),
-                data.get("status"),
-                data.get("overview"),
-                data.get("popularity"),
-                data.get("vote_average"),
-                data.get("vote_count"),
-                checked_at
-            ))
-
-            cur.execute("DELETE FROM tv_genres WHERE tmdb_id=%s", (tmdb_id,))
-            for g in data.get("genres", []) or []:
-                cur.execute(UPSERT_TV_GENRE, (tmdb_id, g.get("id"), g.get("name")))
-
-            cur.execute("DELETE FROM tv_countries WHERE tmdb_id=%s", (tmdb_id,))
-            for iso in data.get("origin_country", []) or []:
-                cur.execute(UPSERT_TV_COUNTRY, (tmdb_id, iso, iso))
-
-            cur.execute("DELETE FROM tv_images WHERE tmdb_id=%s", (tmdb_id,))
-            images = data.get("images") or {}
-            for img in images.get("backdrops", []) or []:
-                cur.execute(UPSERT_TV_IMAGE, (tmdb_id, "backdrop", img.get("file_path"),
-                                              img.get("width"), img.get("height"), img.get("iso_639_1"),
-                                              img.get("aspect_ratio"), img.get("vote_average"), img.get("vote_count")))
-            for img in images.get("posters", []) or []:
-                cur.execute(UPSERT_TV_IMAGE, (tmdb_id, "poster", img.get("file_path"),
-                                              img.get("width"), img.get("height"), img.get("iso_639_1"),
-                                              img.get("aspect_ratio"), img.get("vote_average"), img.get("vote_count")))
-            for img in images.get("logos", []) or []:
-                cur.execute(UPSERT_TV_IMAGE, (tmdb_id, "logo", img.get("file_path"),
-                                              img.get("width"), img.get("height"), img.get("iso_639_1"),
-                                              img.get("aspect_ratio"), img.get("vote_average"), img.get("vote_count")))
-
-            agg = data.get("aggregate_credits") or {}
-            cast = agg.get("cast") or []
-            crew = agg.get("crew") or []
-
-            cast_sorted = sorted(
-                cast, key=lambda x: (-(x.get("total_episode_count") or 0), -(x.get("popularity") or 0))
-            )[:MAX_CAST_PER_TITLE]
-            cur.execute("DELETE FROM tv_cast WHERE tmdb_id=%s", (tmdb_id,))
-            for c in cast_sorted:
-                pid = c.get("id")
-                upsert_person(cur, pid, c.get("name"), c.get("profile_path"), "Acting", c.get("gender"), c.get("popularity"))
-                cur.execute(UPSERT_TV_CAST, (tmdb_id, pid, c.get("total_episode_count"), c.get("popularity")))
-
-            dirs = []
-            for member in crew:
-                jobs = member.get("jobs") or []
-                total_eps = 0
-                for j in jobs:
-                    if (j.get("job") == "Director"):
-                        total_eps += (j.get("episode_count") or 0)
-                if total_eps > 0:
-                    m = dict(member)
-                    m["_dir_episode_count"] = total_eps
-                    dirs.append(m)
-            dirs = sorted(dirs, key=lambda m: -m["_dir_episode_count"])[:MAX_DIRECTORS_PER_TITLE]
-
-            cur.execute("DELETE FROM tv_directors WHERE tmdb_id=%s", (tmdb_id,))
-            for d in dirs:
-                pid = d.get("id")
-                upsert_person(cur, pid, d.get("name"), d.get("profile_path"), d.get("known_for_department"), d.get("gender"), d.get("popularity"))
-                cur.execute(UPSERT_TV_DIRECTOR, (tmdb_id, pid, d["_dir_episode_count"]))
-
-            for p in cast_sorted[:10] + dirs:
-                upsert_person_images(cur, p.get("id"))
-
-            cnx.commit()
-            if i % 20 == 0 or i == len(kept):
-                log.info("TV processed %d/%d", i, len(kept))
-            time.sleep(0.05)
+        enrich(cnx, cur, "TV", kept, fetch_tv, write_tv)
 
 def main():
     ensure_schema()
+    with connect(db=DB_NAME) as cnx, cnx.cursor() as cur:
+        PEOPLE.seed(cur)
     log.info("Processing movies…")
     process_movies()
     log.info("Processing TV…")
     process_tv()
+    PEOPLE.report()
     log.info("Done.")
 
 if __name__ == "__main__":
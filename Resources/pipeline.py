@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# pipeline.py - the whole question pool in one command:
+#   popular lists (tmdbTop1000.py) -> details (enrich-content.py) -> questions row
+#   (refresh-questions.py) -> resized image (fetch-images.py)
+# - Stages run concurrently, each on its own thread(s) and DB connection, connected by bounded
+#   queues: a title moves on as soon as the previous stage has committed it
+# - pipeline_titles keeps a checkpoint per title (details_at, question_url, image_url): an
+#   interrupted run picks up where it stopped and a rerun only touches new or changed titles
+# - Details are fetched again after --refresh-days; the questions row and the image are only
+#   redone when the chosen backdrop changed
+# - Uses the scripts' own functions, so each of them still works on its own
+import os, sys, time, queue, datetime, argparse, logging, threading, importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pymysql
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+def load_script(name, path):
+    # enrich-content.py, refresh-questions.py and fetch-images.py can't be imported by name
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+import tmdbTop1000 as top
+from tmdb_http import TmdbClient
+enrich = load_script("enrich_content", os.path.join(HERE, "enrich-content.py"))
+questions = load_script("refresh_questions", os.path.join(HERE, "refresh-questions.py"))
+images = load_script("fetch_images", os.path.join(ROOT, "fetch-images.py"))
+
+log = logging.getLogger("pipeline")
+
+# --- CONFIG ---
+DB_NAME = top.DB_NAME
+MIN_VOTES = 100                  # same cut as enrich-content.py
+DETAILS_REFRESH_DAYS = 30        # details older than this are fetched again; 0 refetches everything
+IMAGE_WORKERS = 4
+QUEUE_SIZE = 200                 # per stage; a slow stage holds the ones before it back
+MANIFEST_SAVE_EVERY = 25
+
+# Both scripts' clients take tokens from one bucket, so together they stay under TMDB_RATE
+enrich.CLIENT = TmdbClient(enrich.TMDB_API_KEY, bucket=top.CLIENT.bucket)
+
+KINDS = {
+    "movie": dict(label="Movies", list="popular_movies", details="movie_details",
+                  fetch=enrich.fetch_movie, write=enrich.write_movie,
+                  fetch_page=top.fetch_popular_movies, external=top.external_ids_movie,
+                  upsert=top.UPSERT_MOVIE, row=top.movie_row),
+    "tv": dict(label="TV", list="popular_tv", details="tv_details",
+               fetch=enrich.fetch_tv, write=enrich.write_tv,
+               fetch_page=top.fetch_popular_tv, external=top.external_ids_tv,
+               upsert=top.UPSERT_TV, row=top.tv_row),
+}
+
+DDL_STATE = """
+CREATE TABLE IF NOT EXISTS pipeline_titles (
+  type ENUM('movie','tv') NOT NULL,
+  tmdb_id INT NOT NULL,
+  details_at DATE NULL,                  -- details/credits/images last written
+  question_url VARCHAR(512) NULL,        -- backdrop in questions ('' = the title has none)
+  image_url VARCHAR(512) NULL,           -- backdrop whose image files are done
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (type, tmdb_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+"""
+
+UPSERT_STATE = """
+INSERT INTO pipeline_titles (type, tmdb_id, details_at, question_url) VALUES (%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE details_at=VALUES(details_at), question_url=VALUES(question_url);
+"""
+MARK_IMAGE = "UPDATE pipeline_titles SET image_url=%s WHERE question_url=%s"
+
+STOP = threading.Event()
+
+def put(q, item):
+    # Blocking put that gives up once another stage failed or the run was interrupted
+    while not STOP.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def take(q, block=True):
+    # Next item, None at the end of the stream (or on STOP); block=False raises queue.Empty instead of waiting
+    while not STOP.is_set():
+        try:
+            return q.get(timeout=0.5) if block else q.get_nowait()
+        except queue.Empty:
+            if not block:
+                raise
+    return None
+
+class StageStats:
+    def __init__(self, name, every=25):
+        self.name, self.every = name, every
+        self.lock = threading.Lock()
+        self.done = self.failed = 0
+        self.started = time.monotonic()
+
+    def tick(self, ok=True):
+        with self.lock:
+            self.done += 1
+            if not ok:
+                self.failed += 1
+            if self.done % self.every == 0:
+                self.report()
+
+    def report(self):
+        log.info("%s: %d done (%d failed), %.1f/s", self.name, self.done, self.failed,
+                 self.done / max(time.monotonic() - self.started, 1e-6))
+
+class Checkpoints:
+    # pipeline_titles as loaded at the start, falling back to *_details.checked_at for titles
+    # enriched before the pipeline existed. Each title is handed downstream at most once per run.
+    def __init__(self, refresh_days):
+        self.lock = threading.Lock()
+        self.rows = {}       # (kind, tmdb_id) -> (details_at, question_url, image_url)
+        self.queued = set()  # (kind, tmdb_id) already handed on
+        self.cutoff = datetime.date.today() - datetime.timedelta(days=refresh_days) if refresh_days > 0 else None
+
+    def load(self, cur):
+        for kind, spec in KINDS.items():
+            cur.execute(f"SELECT d.tmdb_id, COALESCE(p.details_at, d.checked_at), p.question_url, p.image_url "
+                        f"FROM `{spec['details']}` d LEFT JOIN pipeline_titles p "
+                        f"ON p.type = %s AND p.tmdb_id = d.tmdb_id", (kind,))
+            for tmdb_id, *row in cur.fetchall():
+                self.rows[(kind, tmdb_id)] = tuple(row)
+        log.info("Checkpoints loaded: %d titles with details.", len(self.rows))
+
+    def next_step(self, kind, tmdb_id):
+        # "details", "question", "image" or None when the title is done
+        row = self.rows.get((kind, tmdb_id))
+        if row is None or row[0] is None or self.cutoff is None or row[0] < self.cutoff:
+            return "details"
+        _, question_url, image_url = row
+        if question_url is None:
+            return "question"
+        if question_url and question_url != image_url:
+            return "image"
+        return None
+
+    def image_url(self, kind, tmdb_id):
+        row = self.rows.get((kind, tmdb_id))
+        return row[2] if row else None
+
+    def first(self, key):
+        with self.lock:
+            if key in self.queued:
+                return False
+            self.queued.add(key)
+            return True
+
+# --- Stage 1: popular lists ---
+def list_stage(args, ckpt, q_titles, q_images):
+    # Titles from earlier runs with unfinished stages first, then each freshly committed page
+    def offer(kind, tmdb_id):
+        step = ckpt.next_step(kind, tmdb_id)
+        if step is None or not ckpt.first((kind, tmdb_id)):
+            return True
+        if step == "image":
+            url = ckpt.rows[(kind, tmdb_id)][1]
+            return q_images is None or put(q_images, url)
+        return put(q_titles, (kind, tmdb_id, step == "details"))
+
+    try:
+        with enrich.connect(db=DB_NAME) as cnx, cnx.cursor() as cur:
+            for kind, spec in KINDS.items():
+                cur.execute(f"SELECT tmdb_id FROM `{spec['list']}` WHERE COALESCE(vote_count,0) >= %s "
+                            f"ORDER BY `rank`", (MIN_VOTES,))
+                for (tmdb_id,) in cur.fetchall():
+                    if not offer(kind, tmdb_id):
+                        return
+        if args.no_lists:
+            return
+        for kind, spec in KINDS.items():
+            for results in top.import_pages(spec["list"], spec["label"], spec["fetch_page"], spec["external"],
+                                            spec["upsert"], spec["row"]):
+                for r in results:
+                    if (r.get("vote_count") or 0) >= MIN_VOTES and not offer(kind, r.get("id")):
+                        return
+    except Exception:
+        log.exception("List stage failed, stopping the pipeline.")
+        STOP.set()
+    finally:
+        put(q_titles, None)
+
+# --- Stage 2: details + questions row ---
+def details_stage(ckpt, q_titles, q_images, image_workers, stats):
+    # Fetches run ahead on enrich-content's worker count; this thread writes details, picks the
+    # backdrop and updates the checkpoint in one transaction per title, then hands the URL on
+    def finish(cur, kind, tmdb_id, bundle):
+        if bundle is not None:
+            KINDS[kind]["write"](cur, tmdb_id, bundle)
+            details_at = datetime.date.today()
+        else:
+            details_at = ckpt.rows[(kind, tmdb_id)][0]
+        url = questions.refresh_title(cur, kind, tmdb_id)
+        cur.execute(UPSERT_STATE, (kind, tmdb_id, details_at, url))
+        return url
+
+    try:
+        with enrich.connect(db=DB_NAME, autocommit=False) as cnx, cnx.cursor() as cur, \
+                ThreadPoolExecutor(max_workers=enrich.FETCH_WORKERS) as pool:
+            enrich.PEOPLE.seed(cur)
+            in_flight = {}   # future -> (kind, tmdb_id)
+            ended = False
+            while not STOP.is_set() and (in_flight or not ended):
+                ready = []   # (kind, tmdb_id, bundle or None, error) to write now
+                # Take new titles; only wait for one when there is nothing else to do
+                while not ended and len(in_flight) + len(ready) < enrich.FETCH_WORKERS * 2:
+                    try:
+                        item = take(q_titles, block=not (in_flight or ready))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        ended = True
+                        break
+                    kind, tmdb_id, fetch = item
+                    if fetch:
+                        in_flight[pool.submit(KINDS[kind]["fetch"], tmdb_id)] = (kind, tmdb_id)
+                    else:
+                        ready.append((kind, tmdb_id, None, None))
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=0.2, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        kind, tmdb_id = in_flight.pop(future)
+                        try:
+                            ready.append((kind, tmdb_id, future.result(), None))
+                        except Exception as e:
+                            ready.append((kind, tmdb_id, None, e))
+                for kind, tmdb_id, bundle, err in ready:
+                    if err is not None:
+                        # No checkpoint is written, so the next run tries this title again
+                        log.error("%s %s failed: %s", KINDS[kind]["label"], tmdb_id, err)
+                        stats.tick(ok=False)
+                        continue
+                    try:
+                        url = finish(cur, kind, tmdb_id, bundle)
+                        cnx.commit()
+                    except pymysql.MySQLError as e:
+                        cnx.rollback()
+                        log.error("%s %s DB write failed: %s", KINDS[kind]["label"], tmdb_id, e)
+                        stats.tick(ok=False)
+                        continue
+                    stats.tick()
+                    if url and q_images is not None and url != ckpt.image_url(kind, tmdb_id):
+                        put(q_images, url)
+            if STOP.is_set():
+                pool.shutdown(cancel_futures=True)
+    except Exception:
+        log.exception("Details stage failed, stopping the pipeline.")
+        STOP.set()
+    finally:
+        if q_images is not None:
+            for _ in range(image_workers):
+                put(q_images, None)
+
+# --- Stage 3: images ---
+class UrlLocks:
+    # Titles sharing a backdrop are handled one after the other: the second finds the files
+    # current and only updates its own rows
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locks = {}
+
+    def __call__(self, url):
+        with self.lock:
+            return self.locks.setdefault(url, threading.Lock())
+
+def image_stage(q_images, manifest, lock, url_locks, backend, stats):
+    # fetch-images.py for one URL at a time: plan (manifest vs disk), download + resize, then the
+    # questions row and the checkpoint in one commit
+    with images.connect() as cnx, cnx.cursor() as cur:
+
+        def store(url, entry):
+            try:
+                cur.execute(images.UPDATE_QUESTION_IMAGE, images.db_values(entry) + (url,))
+                cur.execute(MARK_IMAGE, (url, url))
+                cnx.commit()
+            except pymysql.MySQLError as e:
+                cnx.rollback()
+                log.error("DB update failed for %s : %s", url, e)
+                return False
+            with lock:
+                stored[0] += 1
+                if stored[0] % MANIFEST_SAVE_EVERY == 0:
+                    images.save_manifest(manifest)
+            return True
+
+        def record(url, result, validators):
+            with lock:
+                entry = manifest[url] = images.manifest_entry(result, validators, manifest.get(url))
+            return store(url, entry)
+
+        stored = [0]
+        while True:
+            url = take(q_images)
+            if url is None:
+                break
+            try:
+                with url_locks(url):
+                    with lock:
+                        jobs, current = images.plan_jobs([url], manifest, {})
+                    for u in current:
+                        stats.tick(ok=store(u, manifest[u]))
+                    images.run_sequential(jobs, record, stats, backend)
+            except Exception as e:
+                log.error("Failed processing %s : %s", url, e)
+                stats.tick(ok=False)
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Popular lists -> details -> questions -> images, as one streaming run.")
+    ap.add_argument("--pages", type=int, default=top.PAGES, help="Popular list pages per list (default: %(default)s).")
+    ap.add_argument("--refresh-days", type=int, default=DETAILS_REFRESH_DAYS,
+                    help="Fetch details again when older than this (default: %(default)s; 0 = always).")
+    ap.add_argument("--image-workers", type=int, default=IMAGE_WORKERS,
+                    help="Images processed in parallel (default: %(default)s).")
+    ap.add_argument("--backend", choices=("auto", "magick", "pillow"), default="auto",
+                    help="Image backend, as in fetch-images.py (default: %(default)s).")
+    ap.add_argument("--no-lists", action="store_true",
+                    help="Don't refresh the popular lists; only finish titles already in them.")
+    ap.add_argument("--no-images", action="store_true", help="Stop after the questions rows.")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    top.PAGES = args.pages
+    # fetch-images.py works relative to the repo root (static/images)
+    os.chdir(ROOT)
+    if not args.no_images:
+        try:
+            log.info("Image backend: %s", images.get_backend(args.backend).name)
+        except RuntimeError as e:
+            log.error("%s", e)
+            sys.exit(1)
+        for d in (images.IMAGES_DIR, images.VARIANTS_DIR, images.THUMBS_DIR):
+            os.makedirs(d, exist_ok=True)
+
+    top.ensure_schema()
+    enrich.ensure_schema()
+    ckpt = Checkpoints(args.refresh_days)
+    with enrich.connect(db=DB_NAME) as cnx, cnx.cursor() as cur:
+        cur.execute(DDL_STATE)
+        questions.ensure_schema(cur)
+        images.ensure_columns(cur)
+        ckpt.load(cur)
+
+    workers = max(1, args.image_workers)
+    q_titles = queue.Queue(QUEUE_SIZE)
+    q_images = None if args.no_images else queue.Queue(QUEUE_SIZE)
+    manifest = {} if args.no_images else images.load_manifest()
+    manifest_lock = threading.Lock()
+    url_locks = UrlLocks()
+    details_stats, image_stats = StageStats("Details"), StageStats("Images")
+    threads = [
+        threading.Thread(target=list_stage, args=(args, ckpt, q_titles, q_images), name="lists"),
+        threading.Thread(target=details_stage, args=(ckpt, q_titles, q_images, workers, details_stats),
+                         name="details"),
+    ]
+    if q_images is not None:
+        threads += [threading.Thread(target=image_stage, name=f"images-{i}",
+                                     args=(q_images, manifest, manifest_lock, url_locks, args.backend, image_stats))
+                    for i in range(workers)]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(0.5)
+    except KeyboardInterrupt:
+        log.warning("Interrupted: finishing the titles in hand; checkpoints keep the rest for the next run.")
+        STOP.set()
+        for t in threads:
+            t.join()
+    finally:
+        if q_images is not None:
+            with manifest_lock:
+                images.save_manifest(manifest)
+
+    details_stats.report()
+    if q_images is not None:
+        image_stats.report()
+    enrich.PEOPLE.report()
+    log.info("TMDb: %d requests, %d from cache, %d retries.",
+             top.CLIENT.requests + enrich.CLIENT.requests, top.CLIENT.cached + enrich.CLIENT.cached,
+             top.CLIENT.retries + enrich.CLIENT.retries)
+    log.info("Done in %.2fs.", time.perf_counter() - started)
+    if STOP.is_set():
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# refresh-questions.py - keeps `questions` in step with the enriched titles (replaces refresh-questions.sql)
+# - Only titles enriched since the last refresh (*_details.checked_at >= question_refresh.refreshed_on)
+#   are re-ranked; --full re-ranks everything
+# - Best backdrop per title: no-language backdrops by vote_count, vote_average, width (as before),
+#   read per title from idx_backdrop_rank, which covers the whole pick
+# - Upsert instead of INSERT IGNORE: a better backdrop replaces the url and clears the image
+#   columns, so fetch-images.py processes the new file on its next run
+import datetime, logging, argparse, pymysql
+
+# --- LOGGING ---
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+log = logging.getLogger("refresh-questions")
+
+# --- CONFIG ---
+MYSQL_HOST, MYSQL_USER, MYSQL_PASS, MYSQL_PORT = "localhost", "dimme", "Telenet00", 3306
+DB_NAME = "thegame"
+IMAGE_BASE = "https://image.tmdb.org/t/p/original"
+
+# type -> details table, its title column, images table
+KINDS = {
+    "movie": ("movie_details", "title", "movie_images"),
+    "tv": ("tv_details", "name", "tv_images"),
+}
+
+# Indexes the refresh relies on: table -> (name, columns). Added to existing tables when missing
+# (enrich-content.py creates new tables with them). InnoDB appends the primary key to every
+# secondary index, so idx_backdrop_rank also holds file_path and the pick never reads the table.
+INDEXES = {
+    "movie_images": ("idx_backdrop_rank", "tmdb_id, img_type, iso_639_1, vote_count, vote_average, width"),
+    "tv_images": ("idx_backdrop_rank", "tmdb_id, img_type, iso_639_1, vote_count, vote_average, width"),
+    "movie_details": ("idx_checked", "checked_at"),
+    "tv_details": ("idx_checked", "checked_at"),
+}
+
+# Columns added to questions after it was first created: name -> definition. Added to existing
+# tables when missing (UPSERT_QUESTIONS writes the image columns)
+QUESTION_COLUMNS = {
+    "variants": "VARCHAR(255) NULL",
+    "placeholder": "VARCHAR(2048) NULL",
+    "color": "CHAR(7) NULL",
+    "playable": "TINYINT(1) NOT NULL DEFAULT 1",
+}
+
+def connect(db=None, autocommit=True):
+    return pymysql.connect(
+        host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASS, port=MYSQL_PORT,
+        database=db, charset="utf8mb4", cursorclass=pymysql.cursors.Cursor, autocommit=autocommit
+    )
+
+DDL_QUESTIONS = """
+CREATE TABLE IF NOT EXISTS `questions` (
+  `tmdbid`   INT NOT NULL,
+  `type`     ENUM('movie','tv') NOT NULL,
+  `title`    VARCHAR(255) NOT NULL,
+  `url`      VARCHAR(512) NOT NULL,
+  `filename` VARCHAR(255) NULL,
+  `variants` VARCHAR(255) NULL,          -- JSON widths per format, set by fetch-images.py
+  `placeholder` VARCHAR(2048) NULL,      -- base64 blur-up JPEG, set by fetch-images.py
+  `color` CHAR(7) NULL,                  -- average color '#rrggbb', set by fetch-images.py
+  `playable` TINYINT(1) NOT NULL DEFAULT 1, -- 0 when the image is missing/corrupt (fetch-images.py --reconcile)
+  PRIMARY KEY (`tmdbid`,`type`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+"""
+
+# One row per type: the day of the last finished refresh
+DDL_REFRESH = """
+CREATE TABLE IF NOT EXISTS `question_refresh` (
+  `type` ENUM('movie','tv') NOT NULL,
+  `refreshed_on` DATE NOT NULL,
+  PRIMARY KEY (`type`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+"""
+
+UPSERT_REFRESH = """
+INSERT INTO `question_refresh` (`type`, `refreshed_on`) VALUES (%s,%s)
+ON DUPLICATE KEY UPDATE `refreshed_on`=VALUES(`refreshed_on`);
+"""
+
+# Best backdrop per selected title ({where} on the details table d), upserted into questions.
+# A new url clears filename/variants/placeholder/color; MySQL assigns left to right, so url goes last.
+UPSERT_QUESTIONS = """
+INSERT INTO `questions` (tmdbid, `type`, title, url)
+SELECT * FROM (
+  SELECT d.tmdb_id, %s AS kind, d.`{title}` AS new_title,
+    CONCAT(%s, (SELECT i.file_path FROM `{images}` i
+                WHERE i.tmdb_id = d.tmdb_id AND i.img_type = 'backdrop' AND (i.iso_639_1 IS NULL OR i.iso_639_1 = '')
+                ORDER BY i.vote_count DESC, i.vote_average DESC, i.width DESC
+                LIMIT 1)) AS new_url
+  FROM `{details}` d
+  WHERE {where}
+) ranked
+WHERE ranked.new_url IS NOT NULL
+ON DUPLICATE KEY UPDATE
+  filename    = IF(questions.url = ranked.new_url, questions.filename, NULL),
+  variants    = IF(questions.url = ranked.new_url, questions.variants, NULL),
+  placeholder = IF(questions.url = ranked.new_url, questions.placeholder, NULL),
+  color       = IF(questions.url = ranked.new_url, questions.color, NULL),
+  title       = ranked.new_title,
+  url         = ranked.new_url;
+"""
+
+def ensure_schema(cur):
+    cur.execute(DDL_QUESTIONS)
+    cur.execute(DDL_REFRESH)
+    ensure_columns(cur)
+    ensure_indexes(cur)
+
+def ensure_columns(cur):
+    cur.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'questions'")
+    existing = {name.lower() for name, in cur.fetchall()}
+    for name, definition in QUESTION_COLUMNS.items():
+        if name not in existing:
+            log.info("Adding questions.%s column …", name)
+            cur.execute(f"ALTER TABLE `questions` ADD COLUMN `{name}` {definition}")
+
+def ensure_indexes(cur):
+    cur.execute("SELECT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE()")
+    existing = {(t.lower(), i.lower()) for t, i in cur.fetchall()}
+    for table, (name, columns) in INDEXES.items():
+        if (table, name.lower()) not in existing:
+            log.info("Adding index %s.%s (%s) …", table, name, columns)
+            cur.execute(f"ALTER TABLE `{table}` ADD INDEX `{name}` ({columns})")
+
+def upsert_questions(cur, kind, where, params=()):
+    # Re-ranks the titles of one type matching `where` (on details table d); returns affected rows
+    details, title, images = KINDS[kind]
+    return cur.execute(UPSERT_QUESTIONS.format(details=details, title=title, images=images, where=where),
+                       (kind, IMAGE_BASE, *params))
+
+def refresh_title(cur, kind, tmdb_id):
+    # One title (Resources/pipeline.py): its questions url afterwards, '' when it has none
+    upsert_questions(cur, kind, "d.tmdb_id = %s", (tmdb_id,))
+    cur.execute("SELECT url FROM `questions` WHERE tmdbid = %s AND `type` = %s", (tmdb_id, kind))
+    row = cur.fetchone()
+    return row[0] if row else ""
+
+def refresh(cnx, cur, kind, full=False):
+    # Titles enriched on or after the last refresh day (checked_at is a DATE, so the boundary day
+    # is included again; re-ranking an unchanged title writes nothing)
+    today = datetime.date.today()
+    cur.execute("SELECT `refreshed_on` FROM `question_refresh` WHERE `type` = %s", (kind,))
+    row = cur.fetchone()
+    since = None if full or not row else row[0]
+    details = KINDS[kind][0]
+    if since is None:
+        cur.execute(f"SELECT COUNT(*) FROM `{details}`")
+        where, params = "1=1", ()
+    else:
+        cur.execute(f"SELECT COUNT(*) FROM `{details}` WHERE checked_at >= %s", (since,))
+        where, params = "d.checked_at >= %s", (since,)
+    titles = cur.fetchone()[0]
+    affected = upsert_questions(cur, kind, where, params)
+    cur.execute(UPSERT_REFRESH, (kind, today))
+    cnx.commit()
+    log.info("%s: %d titles re-ranked (%s), %d question rows affected.", kind, titles,
+             "all" if since is None else f"enriched since {since}", affected)
+
+def main():
+    ap = argparse.ArgumentParser(description="Refresh questions from the enriched titles.")
+    ap.add_argument("--full", action="store_true", help="Re-rank every title, not only those enriched since the last refresh.")
+    args = ap.parse_args()
+    with connect(db=DB_NAME, autocommit=False) as cnx, cnx.cursor() as cur:
+        ensure_schema(cur)
+        for kind in KINDS:
+            refresh(cnx, cur, kind, args.full)
+    log.info("Done.")
+
+if __name__ == "__main__":
+    main()
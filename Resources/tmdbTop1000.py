@@ -1,10 +1,9 @@
 #!/usr/bin/env python3
 import datetime
-import time
-import requests
 import pymysql
 import logging
-from math import ceil
+from concurrent.futures import ThreadPoolExecutor
+from tmdb_http import TmdbClient
 
 # ====== LOGGING ======
 logging.basicConfig(
@@ -23,33 +22,14 @@ DB_NAME    = "thegame"
 
 PAGES = 60                       # 25 * 20 = 500
 REGION = "BE"                    # bias movie popularity to Belgium
-SLEEP_BETWEEN_PAGES = 0.25
-SLEEP_BETWEEN_EXTERNAL = 0.05
-HTTP_TIMEOUT = 30
-RETRIES = 3
-BACKOFF = 1.5
+EXTERNAL_WORKERS = 8             # parallel external_ids lookups per page (the client rate-limits them)
 
 # ====== TMDb helpers ======
-SESSION = requests.Session()
-BASE = "https://api.themoviedb.org/3"
+# Shared client (Resources/tmdb_http.py): rate limit, retries and the on-disk response cache
+CLIENT = TmdbClient(TMDB_API_KEY, default_params={"language": "en-US"})
 
 def tmdb_get(path, params=None):
-    p = {"api_key": TMDB_API_KEY, "language": "en-US"}
-    if params:
-        p.update(params)
-    last_err = None
-    for attempt in range(1, RETRIES + 1):
-        try:
-            r = SESSION.get(f"{BASE}{path}", params=p, timeout=HTTP_TIMEOUT)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            last_err = e
-            wait = BACKOFF ** (attempt - 1)
-            log.warning("TMDb %s failed (attempt %d/%d): %s; retrying in %.1fs",
-                        path, attempt, RETRIES, e, wait)
-            time.sleep(wait)
-    raise last_err
+    return CLIENT.get(path, params)
 
 def fetch_popular_movies(page: int):
     params = {"page": page}
@@ -107,6 +87,25 @@ CREATE TABLE IF NOT EXISTS `popular_tv` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 """
 
+# One row per list: the last committed page of today's run, so an interrupted import resumes there
+DDL_CHECKPOINTS = """
+CREATE TABLE IF NOT EXISTS `import_checkpoints` (
+  `list_name` VARCHAR(32) NOT NULL,
+  `run_date` DATE NOT NULL,
+  `page` INT NOT NULL,
+  `next_rank` INT NOT NULL,
+  `finished` TINYINT(1) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`list_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+"""
+
+UPSERT_CHECKPOINT = """
+INSERT INTO `import_checkpoints` (`list_name`, `run_date`, `page`, `next_rank`, `finished`)
+VALUES (%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE
+  `run_date`=VALUES(`run_date`), `page`=VALUES(`page`), `next_rank`=VALUES(`next_rank`), `finished`=VALUES(`finished`);
+"""
+
 UPSERT_MOVIE = """
 INSERT INTO `popular_movies`
 (`rank`, `tmdb_id`, `imdb_id`, `title`, `release_date`, `popularity`, `vote_average`, `vote_count`, `checked_at`)
@@ -157,77 +156,87 @@ def ensure_schema():
     with connect(db=DB_NAME) as cnx, cnx.cursor() as cur:
         cur.execute(DDL_MOVIES)
         cur.execute(DDL_TV)
-        log.info("Tables ensured: popular_movies, popular_tv")
+        cur.execute(DDL_CHECKPOINTS)
+        log.info("Tables ensured: popular_movies, popular_tv, import_checkpoints")
+
+def load_checkpoint(cur, list_name, today):
+    # (first page, first rank): resume after the last committed page of an unfinished run from
+    # today; an older or finished run starts over, since the popularity lists change daily
+    cur.execute("SELECT `run_date`, `page`, `next_rank`, `finished` FROM `import_checkpoints` "
+                "WHERE `list_name`=%s", (list_name,))
+    row = cur.fetchone()
+    if row and str(row[0]) == today and not row[3]:
+        log.info("%s: resuming after page %d (rank %d).", list_name, row[1], row[2] - 1)
+        return row[1] + 1, row[2]
+    return 1, 1
+
+def lookup_imdb_ids(pool, ids, known, fetch_external, label):
+    # imdb ids don't change: reuse stored ones, fetch only the rest (concurrently)
+    missing = [i for i in ids if i not in known]
+
+    def fetch(tmdb_id):
+        try:
+            return tmdb_id, fetch_external(tmdb_id).get("imdb_id")
+        except Exception as e:
+            log.warning("%s %s external_ids failed: %s", label, tmdb_id, e)
+            return tmdb_id, None
 
-def upsert_movies():
+    found = dict(pool.map(fetch, missing))
+    return {i: known.get(i) or found.get(i) for i in ids}
+
+def import_pages(list_name, label, fetch_page, fetch_external, upsert, to_row):
+    # Pages in order; per page the missing external ids are fetched in parallel and the page's
+    # rows plus the checkpoint are written in one transaction. Yields each page's results once
+    # committed, so a caller (Resources/pipeline.py) can start on those titles right away.
     checked_at = datetime.date.today().isoformat()
-    rank = 1
-    with connect(db=DB_NAME, autocommit=False) as cnx, cnx.cursor() as cur:
-        for page in range(1, PAGES + 1):
-            data = fetch_popular_movies(page)
+    with connect(db=DB_NAME, autocommit=False) as cnx, cnx.cursor() as cur, \
+            ThreadPoolExecutor(max_workers=EXTERNAL_WORKERS) as pool:
+        start_page, rank = load_checkpoint(cur, list_name, checked_at)
+        cur.execute(f"SELECT `tmdb_id`, `imdb_id` FROM `{list_name}` WHERE `imdb_id` IS NOT NULL")
+        known = dict(cur.fetchall())
+        seen = fetched = 0
+        last_page = start_page - 1   # last committed page
+        for page in range(start_page, PAGES + 1):
+            data = fetch_page(page)
             results = data.get("results", []) or []
             if not results:
-                log.info("Movies page %d returned 0 results, stopping.", page)
+                log.info("%s page %d returned 0 results, stopping.", label, page)
                 break
-            for m in results:
-                tmdb_id = m.get("id")
-                title = (m.get("title") or m.get("original_title") or "")[:255]
-                rel = m.get("release_date") or None
-                pop = m.get("popularity")
-                va = m.get("vote_average")
-                vc = m.get("vote_count")
-
-                imdb_id = None
-                try:
-                    ext = external_ids_movie(tmdb_id)
-                    imdb_id = ext.get("imdb_id")
-                except Exception as e:
-                    log.warning("movie %s external_ids failed: %s", tmdb_id, e)
-
-                cur.execute(UPSERT_MOVIE, (
-                    rank, tmdb_id, imdb_id, title, rel, pop, va, vc, checked_at
-                ))
+            ids = [r.get("id") for r in results]
+            seen += len(ids)
+            fetched += sum(1 for i in ids if i not in known)
+            imdb_ids = lookup_imdb_ids(pool, ids, known, fetch_external, label.lower())
+            rows = []
+            for r in results:
+                rows.append((rank, *to_row(r, imdb_ids.get(r.get("id"))), checked_at))
                 rank += 1
-                time.sleep(SLEEP_BETWEEN_EXTERNAL)
+            cur.executemany(upsert, rows)
+            cur.execute(UPSERT_CHECKPOINT, (list_name, checked_at, page, rank, 0))
             cnx.commit()
-            log.info("Movies page %d committed (+%d rows), rank now %d.",
-                     page, len(results), rank - 1)
-            time.sleep(SLEEP_BETWEEN_PAGES)
+            last_page = page
+            log.info("%s page %d committed (+%d rows), rank now %d.", label, page, len(results), rank - 1)
+            yield results
+        cur.execute(UPSERT_CHECKPOINT, (list_name, checked_at, last_page, rank, 1))
+        cnx.commit()
+        log.info("%s: %d external_ids fetched, %d reused from the table.", label, fetched, seen - fetched)
+
+def import_list(list_name, label, fetch_page, fetch_external, upsert, to_row):
+    for _ in import_pages(list_name, label, fetch_page, fetch_external, upsert, to_row):
+        pass
+
+def movie_row(m, imdb_id):
+    return (m.get("id"), imdb_id, (m.get("title") or m.get("original_title") or "")[:255],
+            m.get("release_date") or None, m.get("popularity"), m.get("vote_average"), m.get("vote_count"))
+
+def tv_row(t, imdb_id):
+    return (t.get("id"), imdb_id, (t.get("name") or t.get("original_name") or "")[:255],
+            t.get("first_air_date") or None, t.get("popularity"), t.get("vote_average"), t.get("vote_count"))
+
+def upsert_movies():
+    import_list("popular_movies", "Movies", fetch_popular_movies, external_ids_movie, UPSERT_MOVIE, movie_row)
 
 def upsert_tv():
-    checked_at = datetime.date.today().isoformat()
-    rank = 1
-    with connect(db=DB_NAME, autocommit=False) as cnx, cnx.cursor() as cur:
-        for page in range(1, PAGES + 1):
-            data = fetch_popular_tv(page)
-            results = data.get("results", []) or []
-            if not results:
-                log.info("TV page %d returned 0 results, stopping.", page)
-                break
-            for t in results:
-                tmdb_id = t.get("id")
-                name = (t.get("name") or t.get("original_name") or "")[:255]
-                fad = t.get("first_air_date") or None
-                pop = t.get("popularity")
-                va = t.get("vote_average")
-                vc = t.get("vote_count")
-
-                imdb_id = None
-                try:
-                    ext = external_ids_tv(tmdb_id)
-                    imdb_id = ext.get("imdb_id")
-                except Exception as e:
-                    log.warning("tv %s external_ids failed: %s", tmdb_id, e)
-
-                cur.execute(UPSERT_TV, (
-                    rank, tmdb_id, imdb_id, name, fad, pop, va, vc, checked_at
-                ))
-                rank += 1
-                time.sleep(SLEEP_BETWEEN_EXTERNAL)
-            cnx.commit()
-            log.info("TV page %d committed (+%d rows), rank now %d.",
-                     page, len(results), rank - 1)
-            time.sleep(SLEEP_BETWEEN_PAGES)
+    import_list("popular_tv", "TV", fetch_popular_tv, external_ids_tv, UPSERT_TV, tv_row)
 
 def main():
     log.info("Starting import (movies region=%s)…", REGION or "global")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# tmdb_http.py - shared TMDb client for the import scripts
+# - One session per client (connection reuse), safe to share between threads
+# - TokenBucket keeps all threads together under TMDb's rate limit
+# - Retries with exponential backoff; 429 waits for Retry-After; other 4xx fail immediately
+# - TMDB_BASE_URL points the scripts at a local stub server for testing
+# - CachedSession keeps GET responses in an on-disk SQLite cache (bodies stored once per
+#   content hash), with per-endpoint TTLs, LRU eviction past TMDB_CACHE_MAX_MB and an
+#   offline mode (TMDB_OFFLINE=1) that only serves from the cache. Image files aren't cached:
+#   they'd stream through memory and push the API responses out of the budget
+import os, re, io, json, time, random, sqlite3, hashlib, threading, logging, contextlib, urllib.parse, requests
+
+log = logging.getLogger("tmdb-http")
+
+# --- CONFIG ---
+BASE = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3").rstrip("/")
+RATE = float(os.environ.get("TMDB_RATE", "40"))     # requests per second, all threads together
+BURST = int(os.environ.get("TMDB_BURST", "20"))
+HTTP_TIMEOUT = 30
+RETRIES = 4
+BACKOFF = 1.5
+MAX_RETRY_AFTER = 60
+
+CACHE_PATH = os.environ.get("TMDB_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmdb-cache.sqlite"))
+CACHE_MAX_BYTES = int(os.environ.get("TMDB_CACHE_MAX_MB", "2048")) * 1024 * 1024
+OFFLINE = os.environ.get("TMDB_OFFLINE", "") not in ("", "0")
+# Seconds a cached response stays fresh, by URL path (first match wins); 0 = never cached
+CACHE_TTLS = [
+    (r"/(movie|tv)/popular", 6 * 3600),
+    (r"/(movie|tv)/\d+/external_ids", 90 * 86400),
+    (r"/person/\d+", 30 * 86400),
+    (r"/(movie|tv)/\d+", 7 * 86400),
+    (r"/t/p/", 0),                    # image.tmdb.org files: fetch-images.py keeps them in static/images
+    (r"", 86400),
+]
+
+class TokenBucket:
+    # Holds up to `capacity` tokens, refilled at `rate` per second; each request takes one
+    def __init__(self, rate, capacity):
+        self.rate, self.capacity = rate, capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # Server said slow down: drain the bucket so every thread waits, not just the one that got the 429
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+class TmdbError(Exception):
+    pass
+
+class OfflineCacheMiss(requests.ConnectionError):
+    pass
+
+class ResponseCache:
+    # responses: one row per request (URL without api_key) pointing at a body by sha256;
+    # bodies: the content itself, shared by requests that returned the same bytes
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path, self.max_bytes = path, max_bytes
+        self.lock = threading.Lock()
+        self.db = None
+        self.size = 0
+        self.hits = self.misses = 0
+
+    def _open(self):
+        # Lazily, so importing this module (e.g. in worker processes) doesn't touch the disk
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS bodies (
+                hash TEXT PRIMARY KEY, size INTEGER NOT NULL, data BLOB NOT NULL)""")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, headers TEXT NOT NULL,
+                hash TEXT NOT NULL, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed_at)")
+            self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+        return self.db
+
+    @staticmethod
+    def key(url):
+        # Sorted query without the api key: a new key or a different param order hits the same entry
+        parts = urllib.parse.urlsplit(url)
+        query = sorted((k, v) for k, v in urllib.parse.parse_qsl(parts.query) if k != "api_key")
+        clean = urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+        return hashlib.sha256(clean.encode()).hexdigest(), clean
+
+    @staticmethod
+    def ttl(url):
+        path = urllib.parse.urlsplit(url).path
+        for pattern, seconds in CACHE_TTLS:
+            if re.search(pattern, path):
+                return seconds
+        return 0
+
+    def get(self, url, allow_stale=False):
+        key, _ = self.key(url)
+        now = time.time()
+        with self.lock:
+            db = self._open()
+            row = db.execute("SELECT r.status, r.headers, r.fetched_at, r.accessed_at, b.data FROM responses r "
+                             "JOIN bodies b ON b.hash = r.hash WHERE r.key = ?", (key,)).fetchone()
+            if row is None or (not allow_stale and now - row[2] > self.ttl(url)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            if now - row[3] > 3600:   # LRU order only needs to be roughly right
+                db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0], json.loads(row[1]), row[4]
+
+    def put(self, url, status, headers, data):
+        key, clean = self.key(url)
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self.lock:
+            db = self._open()
+            with self._transaction(db):
+                added = db.execute("INSERT OR IGNORE INTO bodies (hash, size, data) VALUES (?, ?, ?)",
+                                   (digest, len(data), data)).rowcount
+                db.execute("INSERT OR REPLACE INTO responses (key, url, status, headers, hash, fetched_at, accessed_at) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)", (key, clean, status, json.dumps(headers), digest, now, now))
+            if added:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _transaction(db):
+        # BEGIN … COMMIT, rolled back if anything raises, so the shared connection is
+        # never left inside a transaction (the next BEGIN would fail)
+        db.execute("BEGIN")
+        try:
+            yield
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _evict(self):
+        # Drop least recently used responses until 90% of the budget, then bodies nobody points at
+        db = self.db
+        target = self.max_bytes * 0.9
+        while self.size > target:
+            keys = [k for (k,) in db.execute("SELECT key FROM responses ORDER BY accessed_at LIMIT 200")]
+            if not keys:
+                break
+            with self._transaction(db):
+                db.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in keys])
+                db.execute("DELETE FROM bodies WHERE hash NOT IN (SELECT hash FROM responses)")
+            self.size = db.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+        log.info("HTTP cache evicted down to %.0f MB", self.size / 1024 / 1024)
+
+class CachedSession(requests.Session):
+    # requests.Session whose GETs go through ResponseCache. Conditional requests (If-None-Match /
+    # If-Modified-Since) bypass it: the caller keeps its own validators. Cached responses come back
+    # as ordinary requests.Response objects with .from_cache = True. `bucket` (a TokenBucket) is
+    # only taken for requests that really go to the network.
+    def __init__(self, cache=None, offline=OFFLINE, bucket=None):
+        super().__init__()
+        self.cache = cache or ResponseCache()
+        self.offline, self.bucket = offline, bucket
+
+    def get(self, url, params=None, **kwargs):
+        headers = kwargs.get("headers") or {}
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        if "If-None-Match" in headers or "If-Modified-Since" in headers or not self.cache.ttl(full_url):
+            return self._network(url, params, kwargs, None)
+        cached = self.cache.get(full_url, allow_stale=self.offline)
+        if cached is not None:
+            return self._response(full_url, *cached)
+        if self.offline:
+            raise OfflineCacheMiss(f"offline and not cached: {ResponseCache.key(full_url)[1]}")
+        return self._network(url, params, kwargs, full_url)
+
+    def _network(self, url, params, kwargs, cache_url):
+        if self.offline:
+            raise OfflineCacheMiss(f"offline: {url}")
+        if self.bucket:
+            self.bucket.acquire()
+        r = super().get(url, params=params, **kwargs)
+        r.from_cache = False
+        if cache_url and r.status_code == 200:
+            self.cache.put(cache_url, r.status_code, dict(r.headers), r.content)
+        return r
+
+    @staticmethod
+    def _response(url, status, headers, data):
+        r = requests.Response()
+        r.status_code, r.url, r._content, r._content_consumed = status, url, data, True
+        r.headers = requests.structures.CaseInsensitiveDict(headers)
+        r.raw = io.BytesIO(data)
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        r.from_cache = True
+        return r
+
+class TmdbClient:
+    def __init__(self, api_key, base=BASE, rate=RATE, burst=BURST, default_params=None, bucket=None):
+        # Clients passed the same bucket share one rate limit (Resources/pipeline.py)
+        self.api_key, self.base = api_key, base
+        self.default_params = default_params or {}
+        self.bucket = bucket or TokenBucket(rate, burst)
+        self.session = CachedSession(bucket=self.bucket)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.requests = 0   # went to the network
+        self.cached = 0     # served from the on-disk cache
+        self.retries = 0
+
+    def get(self, path, params=None):
+        p = {"api_key": self.api_key, **self.default_params}
+        if params:
+            p.update(params)
+        err = None
+        for attempt in range(1, RETRIES + 1):
+            try:
+                r = self.session.get(f"{self.base}{path}", params=p, timeout=HTTP_TIMEOUT)
+            except OfflineCacheMiss:
+                raise
+            except requests.RequestException as e:
+                self.requests += 1
+                err, wait = e, self.backoff(attempt)
+            else:
+                if r.from_cache:
+                    self.cached += 1
+                    return r.json()
+                self.requests += 1
+                if r.status_code == 429:
+                    wait = self.retry_after(r, attempt)
+                    self.bucket.pause(wait)
+                    err = TmdbError(f"429 Too Many Requests for {path}")
+                elif r.status_code >= 500:
+                    err, wait = TmdbError(f"{r.status_code} for {path}"), self.backoff(attempt)
+                else:
+                    r.raise_for_status()   # other 4xx: retrying won't help
+                    return r.json()
+            if attempt == RETRIES:
+                break
+            self.retries += 1
+            log.warning("GET %s failed (attempt %d/%d): %s; retry in %.1fs", path, attempt, RETRIES, err, wait)
+            time.sleep(wait)
+        raise err
+
+    @staticmethod
+    def backoff(attempt):
+        # 1.0, 1.5, 2.25, ... plus jitter so threads that failed together don't retry together
+        return BACKOFF ** (attempt - 1) * (1 + random.random() * 0.25)
+
+    @staticmethod
+    def retry_after(response, attempt):
+        try:
+            return min(MAX_RETRY_AFTER, max(0.0, float(response.headers.get("Retry-After"))))
+        except (TypeError, ValueError):
+            return TmdbClient.backoff(attempt)
@@ -1,20 +1,595 @@
 import os
-import pymysql.cursors
-from flask import Flask, jsonify, request, render_template
+import time
+import secrets
+import threading
+import bisect
+import datetime
+import atexit
+import queue
+import io
+import json
+import functools
+from collections import OrderedDict
+from array import array
+from flask import Flask, jsonify, request, render_template, send_file
 import random
+from storage import open_storage, StorageError, StorageUnavailable
+from catalog import QuestionCatalog, MappedCatalog, CATALOG_FILE
+
+try:
+    from PIL import Image
+except ImportError:  # sprites are optional; the client falls back to single thumbnails
+    Image = None
 
 # Initialize the Flask application
 app = Flask(__name__)
 
-# --- Database Connection Details ---
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST'),
-    'user': os.environ.get('DB_USER'),
-    'password': os.environ.get('DB_PASSWORD'),
-    'database': 'thegame',
-    'cursorclass': pymysql.cursors.DictCursor
-}   
-    
+# --- Storage ---
+# MySQL by default; STORAGE_BACKEND=sqlite serves everything from a local file
+# instead (see storage.py), e.g. for offline development.
+STORAGE = open_storage()
+
+# --- Background Pollers ---
+class Poller:
+    """Daemon thread calling `check` every `interval` seconds (0 = never), one per process."""
+
+    thread_name = 'poller'
+    failure = "Background check failed"
+
+    def __init__(self, interval, check):
+        self.interval = interval
+        self._check = check
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = dict(checks=0, errors=0)
+
+    def start(self):
+        # Per process: a worker forked after the import doesn't inherit the thread
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, poll_seconds=self.interval)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._check()
+            except (StorageError, OSError, ValueError) as e:
+                print(f"{self.failure}: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+
+
+# --- Question Catalog ---
+# The questions table is small (a few hundred rows) and read-only during play,
+# so it is kept in memory and sampled there instead of running ORDER BY RAND()
+# against the database on every click. With CATALOG_FILE set, workers map a
+# prebuilt catalog file instead (see catalog.py). A background thread polls the
+# source every CATALOG_POLL_SECONDS (0 = never) and swaps in a fresh catalog
+# when it changed; games in progress keep the catalog they were dealt from.
+CATALOG_POLL_SECONDS = float(os.environ.get('CATALOG_POLL_SECONDS', 30))
+
+
+def catalog_source_version(file_usable=True):
+    """Cheap fingerprint of the catalog source: the catalog file's stat, or the questions' count and checksum.
+
+    While the catalog file is unusable (file_usable=False) the catalog comes from storage, so both
+    count: storage changes reload it, and so does a replaced file.
+    """
+    file_version = None
+    if CATALOG_FILE:
+        try:
+            st = os.stat(CATALOG_FILE)
+            file_version = f'file:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}'
+        except OSError:
+            pass
+    if file_version and file_usable:
+        return file_version
+    storage_version = STORAGE.catalog_version()
+    return f'{file_version}|{storage_version}' if file_version else storage_version
+
+
+def load_catalog():
+    """Map the catalog file if CATALOG_FILE names one, else read the playable questions from storage.
+
+    Returns (catalog, source_version). The fingerprint is taken first, so a change landing
+    during the load is seen by the next poll.
+    """
+    if CATALOG_FILE:
+        source_version = catalog_source_version()
+        try:
+            return MappedCatalog(CATALOG_FILE), source_version
+        except (OSError, ValueError) as e:
+            print(f"Catalog file not usable, reading questions from storage: {e}")
+    source_version = catalog_source_version(file_usable=False)
+    catalog = QuestionCatalog(STORAGE.load_questions())
+    catalog.version = source_version.rpartition('|')[2]   # the storage part, as without a file
+    return catalog, source_version
+
+
+CATALOG = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the current catalog, loading it on first use."""
+    if CATALOG is None:
+        with _catalog_lock:
+            if CATALOG is None:
+                refresh_catalog()
+    CATALOG_RELOADER.start()
+    return CATALOG
+
+
+def refresh_catalog():
+    """Reload the catalog and swap it in; readers keep their old snapshot."""
+    global CATALOG
+    started = time.perf_counter()
+    catalog, source_version = load_catalog()
+    CATALOG = catalog
+    CATALOG_RELOADER.loaded(catalog, source_version, time.perf_counter() - started)
+    print(f"Question catalog loaded: {len(catalog)} questions (version {catalog.version})")
+    return catalog
+
+
+class CatalogReloader(Poller):
+    """Reloads the catalog when its source version changes."""
+
+    thread_name = 'catalog-reloader'
+    failure = "Catalog reload failed, keeping the current one"
+
+    def __init__(self, interval=CATALOG_POLL_SECONDS):
+        super().__init__(interval, self.check)
+        self.source_version = None
+        self.file_usable = True
+        self.stats.update(version=None, questions=0, loaded_at=None, load_seconds=None, reloads=0)
+
+    def loaded(self, catalog, source_version, seconds):
+        with self._lock:
+            self.source_version = source_version
+            self.file_usable = not CATALOG_FILE or isinstance(catalog, MappedCatalog)
+            self.stats.update(version=catalog.version, questions=len(catalog), load_seconds=round(seconds, 4),
+                              loaded_at=datetime.datetime.now().isoformat(timespec='seconds'))
+
+    def check(self):
+        """Reload the catalog if its source changed since it was loaded; True when it did."""
+        with self._lock:
+            self.stats['checks'] += 1
+        if catalog_source_version(self.file_usable) == self.source_version:
+            return False
+        with _catalog_lock:
+            refresh_catalog()
+        with self._lock:
+            self.stats['reloads'] += 1
+        return True
+
+
+CATALOG_RELOADER = CatalogReloader()
+
+
+# --- Game Sessions ---
+# Each game gets a token and a pre-shuffled deck of catalog indices, so the
+# client no longer has to send back every id it has seen. A session is a few KB
+# (2 bytes per question) and expires after SESSION_TTL_SECONDS of inactivity.
+# Sessions live in the memory of the process that created them: with several
+# workers, or after expiry, a token is answered with 404 and the client carries
+# on with the sessionless seen_ids requests.
+SESSION_TTL_SECONDS = 15 * 60
+MAX_SESSIONS = 20000
+
+
+class GameSession:
+    """One game's deck: a permutation of catalog indices and a read position."""
+
+    __slots__ = ('catalog', 'deck', 'position', 'expires_at')
+
+    def __init__(self, catalog):
+        # The session keeps the catalog it was dealt from, so a refresh
+        # mid-game can't shift the indices under it.
+        self.catalog = catalog
+        self.deck = array('H' if len(catalog) < 65536 else 'I', range(len(catalog)))
+        random.shuffle(self.deck)
+        self.position = 0
+        self.expires_at = 0.0
+
+    def deal(self, count=1):
+        """Pop the next `count` catalog indices off the deck (fewer when it runs out).
+
+        Returns (first_slot, indices); slot n is the n-th question dealt this game.
+        """
+        first_slot = self.position
+        indices = self.deck[first_slot:first_slot + count].tolist()
+        self.position += len(indices)
+        return first_slot, indices
+
+    def dealt(self):
+        """Catalog indices dealt so far, in slot order."""
+        return self.deck[:self.position].tolist()
+
+
+class SessionStore:
+    """Thread-safe token -> GameSession map with sliding TTL eviction."""
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+
+    def create(self, catalog):
+        session = GameSession(catalog)
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._evict(time.monotonic())
+            session.expires_at = time.monotonic() + self.ttl
+            self._sessions[token] = session
+        return token, session
+
+    def get(self, token):
+        """Return the live session for `token` and extend its lifetime, or None."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None or session.expires_at < now:
+                return None
+            session.expires_at = now + self.ttl
+            self._sessions.move_to_end(token)
+            return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self, now):
+        # Entries are kept in last-use order, so expired ones sit at the front
+        while self._sessions:
+            token, session = next(iter(self._sessions.items()))
+            if session.expires_at >= now and len(self._sessions) < self.max_sessions:
+                break
+            del self._sessions[token]
+
+
+SESSIONS = SessionStore()
+MAX_BATCH_QUESTIONS = 10
+
+
+# --- Leaderboard Cache ---
+# The top scores are kept sorted in memory and updated by submit_score when it
+# inserts, so leaderboard reads never hit the database once the cache is warm. Besides
+# the all-time board there are daily and weekly boards; when their window ends
+# they are emptied in place and start filling again with the new window.
+# Scores that other worker processes received come in through LeaderboardReloader.
+LEADERBOARD_CACHE_SIZE = 100
+
+
+def start_of_day(now):
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def start_of_week(now):
+    return start_of_day(now) - datetime.timedelta(days=now.weekday())
+
+
+# period name -> function giving the start of the window containing `now`
+LEADERBOARD_PERIODS = {'all': None, 'daily': start_of_day, 'weekly': start_of_week}
+
+
+class LeaderboardCache:
+    """Bounded, sorted top-N of (player_name, score), highest score first."""
+
+    def __init__(self, size=LEADERBOARD_CACHE_SIZE, window=None):
+        self.size = size
+        self.window = window
+        self.window_start = None
+        self.loaded = False
+        self._keys = []      # (-score, seq): ties keep the earliest entry first
+        self._entries = []   # matching {"player_name", "score"} dicts
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def current_window_start(self):
+        return self.window(datetime.datetime.now()) if self.window else None
+
+    def load(self, rows, window_start=None):
+        """Replace the contents with {player_name, score} rows from one window, best first."""
+        with self._lock:
+            self._keys, self._entries = [], []
+            self.window_start = window_start
+            for row in rows:
+                self._insert(row['player_name'], row['score'])
+            self.loaded = True
+
+    def add(self, player_name, score, played_on):
+        with self._lock:
+            self._rotate()
+            if self.window_start is not None and played_on < self.window_start:
+                return
+            self._insert(player_name, score)
+
+    def top(self, limit):
+        with self._lock:
+            self._rotate()
+            return self._entries[:limit]
+
+    def _rotate(self):
+        window_start = self.current_window_start()
+        if window_start is not None and self.window_start is not None and window_start > self.window_start:
+            self._keys, self._entries = [], []
+            self.window_start = window_start
+
+    def _insert(self, player_name, score):
+        self._seq += 1
+        key = (-score, self._seq)
+        if len(self._keys) >= self.size and key >= self._keys[-1]:
+            return
+        position = bisect.bisect(self._keys, key)
+        self._keys.insert(position, key)
+        self._entries.insert(position, {"player_name": player_name, "score": score})
+        if len(self._keys) > self.size:
+            self._keys.pop()
+            self._entries.pop()
+
+
+LEADERBOARDS = {period: LeaderboardCache(window=window)
+                for period, window in LEADERBOARD_PERIODS.items()}
+
+
+def get_leaderboard_cache(period='all'):
+    """Return the cache for a period, warming it from storage on first use."""
+    leaderboard = LEADERBOARDS[period]
+    if not leaderboard.loaded:
+        window_start = leaderboard.current_window_start()
+        leaderboard.load(STORAGE.top_scores(leaderboard.size, window_start), window_start)
+    LEADERBOARD_RELOADER.start()
+    return leaderboard
+
+
+# --- Score Rank Index ---
+# Fenwick (binary indexed) tree over one bucket per score, so "what rank would
+# this score get" is answered in O(log n) without a COUNT(*) scan.
+RANK_MAX_SCORE = 10000   # higher scores share the top bucket
+
+
+class ScoreRankIndex:
+    """Counts of every leaderboard score, answering rank and percentile queries."""
+
+    def __init__(self, max_score=RANK_MAX_SCORE):
+        self.max_score = max_score
+        self.total = 0
+        self.loaded = False
+        self._tree = array('q', bytes(8 * (max_score + 2)))
+        self._lock = threading.Lock()
+
+    def load(self, histogram):
+        """Replace the contents with (score, count) pairs."""
+        with self._lock:
+            self._tree = array('q', bytes(8 * (self.max_score + 2)))
+            self.total = 0
+            for score, count in histogram:
+                self._add(score, count)
+            self.loaded = True
+
+    def add(self, score, count=1):
+        with self._lock:
+            self._add(score, count)
+
+    def rank(self, score):
+        """1-based position `score` takes on the all-time board (ties share the best rank)."""
+        with self._lock:
+            return self.total - self._count_at_most(score) + 1
+
+    def percentile(self, score):
+        """Percentage of recorded scores that `score` equals or beats."""
+        with self._lock:
+            if not self.total:
+                return 100.0
+            return 100.0 * self._count_at_most(score) / self.total
+
+    def _bucket(self, score):
+        return min(max(int(score), 0), self.max_score) + 1
+
+    def _add(self, score, count):
+        self.total += count
+        i = self._bucket(score)
+        while i < len(self._tree):
+            self._tree[i] += count
+            i += i & -i
+
+    def _count_at_most(self, score):
+        total = 0
+        i = self._bucket(score)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+RANKS = ScoreRankIndex()
+
+
+def get_rank_index():
+    """Return the score rank index, building it from storage on first use."""
+    if not RANKS.loaded:
+        RANKS.load(STORAGE.score_histogram())
+    LEADERBOARD_RELOADER.start()
+    return RANKS
+
+
+# --- Score Writer ---
+# submit_score only validates and queues; this background thread writes the
+# queue to storage in multi-row INSERTs, so a burst of games ending together
+# doesn't stack up commits on the request threads. The in-memory boards are
+# updated at submit time, and the queue is drained on interpreter shutdown.
+SCORE_WRITE_BEHIND = os.environ.get('SCORE_WRITE_BEHIND', '1') != '0'
+SCORE_FLUSH_SIZE = 100       # max rows per INSERT
+SCORE_FLUSH_INTERVAL = 0.5   # seconds to gather a batch before flushing
+SCORE_RETRY_MAX_WAIT = 30
+PLAYER_NAME_MAX = 50         # leaderboard.player_name is VARCHAR(50)
+
+
+class ScoreWriter:
+    """Write-behind queue flushing (player_name, score, played_on) rows in batches."""
+
+    _STOP = object()
+
+    def __init__(self, storage, batch_size=SCORE_FLUSH_SIZE, interval=SCORE_FLUSH_INTERVAL):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closing = threading.Event()   # set by close(): stop retrying, drop what can't be written
+        self._unsaved = 0    # submitted, not yet written or dropped
+        self.stats = dict(queued=0, written=0, batches=0, retries=0, dropped=0)
+
+    def submit(self, player_name, score, played_on):
+        with self._lock:
+            self.stats['queued'] += 1
+            self._unsaved += 1
+            # Also after close() or in a forked worker, where the old thread is gone
+            if self._thread is None or not self._thread.is_alive():
+                self._closing.clear()
+                self._thread = threading.Thread(target=self._run, name='score-writer', daemon=True)
+                self._thread.start()
+        self._queue.put((player_name, score, played_on))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def unsaved(self):
+        """Scores submitted that storage doesn't have yet (queued or being written)."""
+        with self._lock:
+            return self._unsaved
+
+    def close(self, timeout=30):
+        """Flush everything still queued and stop the worker; scores storage won't take are reported."""
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._closing.set()
+            self._queue.put(self._STOP)
+            thread.join(timeout)
+        unsaved = self.unsaved()
+        if unsaved:
+            print(f"Score writer stopped with {unsaved} scores not saved")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch, stopping)
+            with self._lock:
+                self._unsaved -= len(batch)
+
+    def _flush(self, batch, stopping=False):
+        wait = 0.5
+        while True:
+            try:
+                self.write(batch)
+                return
+            except StorageUnavailable as e:
+                # Connection trouble: keep the batch and retry, unless we're shutting down
+                if stopping or self._closing.is_set():
+                    print(f"Database error, {len(batch)} scores not saved: {batch} ({e})")
+                    with self._lock:
+                        self.stats['dropped'] += len(batch)
+                    return
+                print(f"Database error while saving scores, retrying in {wait:.1f}s: {e}")
+                with self._lock:
+                    self.stats['retries'] += 1
+                self._closing.wait(wait)
+                wait = min(wait * 2, SCORE_RETRY_MAX_WAIT)
+            except StorageError as e:
+                # A bad row fails the whole INSERT: fall back to one row at a time
+                print(f"Database error in score batch, saving rows one by one: {e}")
+                for row in batch:
+                    try:
+                        self.write([row])
+                    except StorageError as e:
+                        print(f"Database error, score not saved: {row} ({e})")
+                        with self._lock:
+                            self.stats['dropped'] += 1
+                return
+
+    def write(self, rows):
+        """INSERT rows in one batch."""
+        self.storage.insert_scores(rows)
+        with self._lock:
+            self.stats['written'] += len(rows)
+            self.stats['batches'] += 1
+
+
+SCORE_WRITER = ScoreWriter(STORAGE)
+atexit.register(SCORE_WRITER.close)
+
+
+# --- Leaderboard Refresh ---
+# Each worker process keeps its own boards and rank index and only adds the
+# scores it received itself. To see the others', it polls the newest
+# leaderboard id every LEADERBOARD_POLL_SECONDS (0 = never) and re-warms
+# everything from storage when it moved.
+LEADERBOARD_POLL_SECONDS = float(os.environ.get('LEADERBOARD_POLL_SECONDS', 10))
+
+
+class LeaderboardReloader(Poller):
+    """Re-warms the leaderboard caches and rank index when storage has scores they don't."""
+
+    thread_name = 'leaderboard-reloader'
+    failure = "Leaderboard refresh failed, keeping the cached boards"
+
+    def __init__(self, interval=LEADERBOARD_POLL_SECONDS):
+        super().__init__(interval, self.check)
+        self.version = None
+        self.stats.update(version=None, reloads=0, deferred=0)
+
+    def check(self):
+        """Reload the boards if the newest stored score changed; True when they were."""
+        with self._lock:
+            self.stats['checks'] += 1
+        if SCORE_WRITER.unsaved():
+            # Reloading now would drop this process's scores that are still on their way to storage
+            with self._lock:
+                self.stats['deferred'] += 1
+            return False
+        version = STORAGE.leaderboard_version()
+        if version == self.version:
+            return False
+        for leaderboard in LEADERBOARDS.values():
+            window_start = leaderboard.current_window_start()
+            leaderboard.load(STORAGE.top_scores(leaderboard.size, window_start), window_start)
+        RANKS.load(STORAGE.score_histogram())
+        with self._lock:
+            self.version = version
+            self.stats['version'] = version
+            self.stats['reloads'] += 1
+        return True
+
+
+LEADERBOARD_RELOADER = LeaderboardReloader()
+
 
 @app.route('/')
 def home():
@@ -29,73 +604,174 @@ def home():
 
 # --- API Routes ---
 
-@app.route('/get_question')
-def get_question():
-    """API endpoint to fetch a new, random question from the database."""
-    connection = None
+IMAGE_MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpg': 'image/jpeg'}
+THUMBS_DIR = os.path.join(app.static_folder, 'images', 'thumbs')
+THUMB_SIZE = (160, 90)   # must match fetch-images.py
+THUMB_QUALITY = 70
+
+
+@functools.lru_cache(maxsize=64)
+def parse_variants(variants):
+    """'{"webp": [480, 960]}' -> (('webp', (480, 960)),); most rows share a handful of values."""
+    try:
+        return tuple((fmt, tuple(widths)) for fmt, widths in json.loads(variants).items())
+    except (TypeError, ValueError, AttributeError):
+        return ()
+
+
+def image_sources(filename, variants):
+    """srcset per format for the responsive variants built by fetch-images.py, best format first."""
+    stem = os.path.splitext(filename)[0]
+    return [
+        {
+            "type": IMAGE_MIME_TYPES.get(fmt, f"image/{fmt}"),
+            "srcset": ", ".join(f"/static/images/variants/{stem}-{width}w.{fmt} {width}w" for width in widths),
+        }
+        for fmt, widths in parse_variants(variants) if widths
+    ]
+
+
+def question_payload(catalog, index):
+    """Build the JSON-ready question for a catalog index, answers already shuffled."""
+    correct_answer = catalog.titles[index]
+    all_answers = catalog.distractors(correct_answer) + [correct_answer]
+    random.shuffle(all_answers)
+    filename = catalog.filenames[index]
+    return {
+        "id": catalog.ids[index],
+        "visual": f"/static/images/{filename}",
+        "thumb": f"/static/images/thumbs/{os.path.splitext(filename)[0]}.jpg",
+        "sources": image_sources(filename, catalog.variants[index]) if catalog.variants[index] else [],
+        # Painted instantly while the real image loads
+        "placeholder": f"data:image/jpeg;base64,{catalog.placeholders[index]}" if catalog.placeholders[index] else None,
+        "color": catalog.colors[index],
+        "answers": all_answers,
+        "correct_answer": correct_answer
+    }
+
+@app.route('/start_game', methods=['POST'])
+def start_game():
+    """API endpoint to open a game session with its own shuffled question deck."""
     try:
-        connection = pymysql.connect(**DB_CONFIG)
-        seen_ids_str = request.args.get('seen_ids', '')
-        seen_ids = [int(id) for id in seen_ids_str.split(',') if id.isdigit()]
-
-        with connection.cursor() as cursor:
-            sql_question = "SELECT tmdbid, title, filename FROM questions"
-            if seen_ids:
-                placeholders = ', '.join(['%s'] * len(seen_ids))
-                sql_question += f" WHERE tmdbid NOT IN ({placeholders})"
-            sql_question += " ORDER BY RAND() LIMIT 1"
-            
-            cursor.execute(sql_question, seen_ids)
-            question = cursor.fetchone()
-
-            if not question:
-                return jsonify({"error": "No more questions available"}), 404
-
-            correct_answer = question['title']
-            question_id = question['tmdbid']
-
-            sql_wrong_answers = "SELECT title FROM questions WHERE title != %s ORDER BY RAND() LIMIT 7"
-            cursor.execute(sql_wrong_answers, (correct_answer,))
-            wrong_answers = [row['title'] for row in cursor.fetchall()]
-
-            all_answers = wrong_answers + [correct_answer]
-            random.shuffle(all_answers)
-
-            response = {
-                "id": question_id,
-                "visual": f"/static/images/{question['filename']}",
-                "answers": all_answers,
-                "correct_answer": correct_answer
-            }
-            return jsonify(response)
-
-    except pymysql.MySQLError as e:
+        catalog = get_catalog()
+    except StorageError as e:
         print(f"Database error: {e}")
         return jsonify({"error": "A database error occurred"}), 500
-    finally:
-        if connection:
-            connection.close()
+
+    token, session = SESSIONS.create(catalog)
+    return jsonify({"session": token, "questions": len(session.deck)})
+
+def deal_for_request(count):
+    """Deal up to `count` questions for this request's session, or its seen_ids without one.
+
+    Returns (catalog, indices, first_slot, error) where error is a ready (response, status)
+    tuple and first_slot is None for sessionless requests.
+    """
+    token = request.args.get('session')
+    if token:
+        session = SESSIONS.get(token)
+        if session is None:
+            return None, [], None, (jsonify({"error": "Unknown or expired game session"}), 404)
+        first_slot, indices = session.deal(count)
+        return session.catalog, indices, first_slot, None
+
+    # Sessionless fallback for older clients that still send seen_ids
+    seen_ids_str = request.args.get('seen_ids', '')
+    seen_ids = {int(id) for id in seen_ids_str.split(',') if id.isdigit()}
+    try:
+        catalog = get_catalog()
+    except StorageError as e:
+        print(f"Database error: {e}")
+        return None, [], None, (jsonify({"error": "A database error occurred"}), 500)
+    indices = []
+    for _ in range(count):
+        index = catalog.random_index(exclude_ids=seen_ids)
+        if index is None:
+            break
+        indices.append(index)
+        seen_ids.add(catalog.ids[index])
+    return catalog, indices, None, None
+
+def dealt_payloads(catalog, indices, first_slot):
+    questions = [question_payload(catalog, index) for index in indices]
+    if first_slot is not None:
+        # Position in the game's summary sprite
+        for slot, question in enumerate(questions, start=first_slot):
+            question["slot"] = slot
+    return questions
+
+@app.route('/get_question')
+def get_question():
+    """API endpoint to fetch the next question of a game session."""
+    catalog, indices, first_slot, error = deal_for_request(1)
+    if error:
+        return error
+    if not indices:
+        return jsonify({"error": "No more questions available"}), 404
+    return jsonify(dealt_payloads(catalog, indices, first_slot)[0])
+
+@app.route('/get_questions')
+def get_questions():
+    """API endpoint to fetch the next few questions at once so the client can prefetch."""
+    count = max(1, min(request.args.get('count', 3, type=int), MAX_BATCH_QUESTIONS))
+    catalog, indices, first_slot, error = deal_for_request(count)
+    if error:
+        return error
+    # An empty list means the deck is exhausted
+    return jsonify({"questions": dealt_payloads(catalog, indices, first_slot)})
+
+@app.route('/summary_sprite')
+def summary_sprite():
+    """API endpoint returning one JPEG strip with the thumbnail of every question dealt in a game.
+
+    Thumbnail n (THUMB_SIZE, from fetch-images.py) sits at y = n * height, matching each question's slot.
+    """
+    session = SESSIONS.get(request.args.get('session', ''))
+    if session is None:
+        return jsonify({"error": "Unknown or expired game session"}), 404
+    if Image is None:
+        return jsonify({"error": "Sprites are not available on this server"}), 501
+    dealt = session.dealt()
+    if not dealt:
+        return jsonify({"error": "No questions dealt yet"}), 404
+
+    width, height = THUMB_SIZE
+    sprite = Image.new('RGB', (width, height * len(dealt)), (34, 34, 34))
+    for slot, index in enumerate(dealt):
+        path = os.path.join(THUMBS_DIR, os.path.splitext(session.catalog.filenames[index])[0] + '.jpg')
+        try:
+            with Image.open(path) as thumb:
+                thumb.draft('RGB', THUMB_SIZE)
+                sprite.paste(thumb.convert('RGB').resize(THUMB_SIZE), (0, slot * height))
+        except OSError:
+            pass  # no thumbnail yet: leave the cell blank
+    buffer = io.BytesIO()
+    sprite.save(buffer, 'JPEG', quality=THUMB_QUALITY)
+    buffer.seek(0)
+    response = send_file(buffer, mimetype='image/jpeg')
+    response.headers['Cache-Control'] = 'private, max-age=600'
+    return response
 
 @app.route('/get_leaderboard')
 def get_leaderboard():
     """API endpoint to fetch the top scores, with a configurable limit."""
     # --- FIX: Get limit from request args, default to 10 if not provided ---
     limit = request.args.get('limit', 10, type=int)
-    connection = None
+    period = request.args.get('period', 'all')
+    if period not in LEADERBOARD_PERIODS:
+        return jsonify({"error": f"Unknown period, use one of: {', '.join(LEADERBOARD_PERIODS)}"}), 400
+    if limit < 0:
+        # SQLite reads a negative LIMIT as no limit at all, MySQL rejects it
+        return jsonify({"error": "limit must not be negative"}), 400
     try:
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
-            # --- FIX: Use the limit variable in the SQL query ---
-            sql = "SELECT player_name, score FROM leaderboard ORDER BY score DESC LIMIT %s"
-            cursor.execute(sql, (limit,))
-            leaderboard = cursor.fetchall()
-            return jsonify(leaderboard)
-    except pymysql.MySQLError as e:
+        if limit <= LEADERBOARD_CACHE_SIZE:
+            return jsonify(get_leaderboard_cache(period).top(limit))
+        window_start = LEADERBOARDS[period].current_window_start()
+        # --- FIX: Use the limit variable in the SQL query ---
+        return jsonify(STORAGE.top_scores(limit, window_start))
+    except StorageError as e:
         print(f"Database error: {e}")
         return jsonify({"error": "Could not fetch leaderboard"}), 500
-    finally:
-        if connection:
-            connection.close()
 
 @app.route('/submit_score', methods=['POST'])
 def submit_score():
@@ -106,21 +782,91 @@ def submit_score():
 
     if not player_name or score is None:
         return jsonify({"success": False, "error": "Invalid data provided"}), 400
+    try:
+        score = int(score)  # the cache compares scores, so no strings sneaking in
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "Invalid data provided"}), 400
+    player_name = str(player_name).strip()[:PLAYER_NAME_MAX]
 
-    connection = None
     try:
-        connection = pymysql.connect(**DB_CONFIG)
-        with connection.cursor() as cursor:
-            sql = "INSERT INTO leaderboard (player_name, score) VALUES (%s, %s)"
-            cursor.execute(sql, (player_name, score))
-        connection.commit()
-        return jsonify({"success": True})
-    except pymysql.MySQLError as e:
+        leaderboards = [get_leaderboard_cache(period) for period in LEADERBOARD_PERIODS]
+        ranks = get_rank_index()
+        played_on = datetime.datetime.now().replace(microsecond=0)
+        if SCORE_WRITE_BEHIND:
+            SCORE_WRITER.submit(player_name, score, played_on)
+        else:
+            SCORE_WRITER.write([(player_name, score, played_on)])
+    except StorageError as e:
         print(f"Database error: {e}")
         return jsonify({"success": False, "error": "Database error occurred while saving"}), 500
-    finally:
-        if connection:
-            connection.close()
+
+    # The cached boards see the new score right away, before it reaches the database
+    for leaderboard in leaderboards:
+        leaderboard.add(player_name, score, played_on)
+    ranks.add(score)
+    return jsonify({"success": True})
+
+@app.route('/rank')
+def rank():
+    """API endpoint returning the rank and percentile a score gets on the all-time board.
+
+    With `limit` it also says whether the score makes the top `limit` of `period`.
+    """
+    score = request.args.get('score', type=int)
+    if score is None:
+        return jsonify({"error": "A numeric score is required"}), 400
+    try:
+        ranks = get_rank_index()
+    except StorageError as e:
+        print(f"Database error: {e}")
+        return jsonify({"error": "Could not compute rank"}), 500
+
+    position = ranks.rank(score)
+    response = {
+        "score": score,
+        "rank": position,
+        "total": ranks.total,
+        "percentile": round(ranks.percentile(score), 1),
+    }
+    limit = request.args.get('limit', type=int)
+    period = request.args.get('period', 'all')
+    if limit is not None and period != 'all' and period in LEADERBOARD_PERIODS and limit <= LEADERBOARD_CACHE_SIZE:
+        # Qualifying for a daily/weekly board only depends on that board's top `limit`
+        try:
+            board = get_leaderboard_cache(period).top(limit)
+        except StorageError as e:
+            print(f"Database error: {e}")
+            return jsonify({"error": "Could not compute rank"}), 500
+        response["qualifies"] = score > 0 and (len(board) < limit or score >= board[-1]["score"])
+    elif limit is not None:
+        response["qualifies"] = score > 0 and position <= limit
+    return jsonify(response)
+
+@app.route('/stats')
+def stats():
+    """API endpoint exposing runtime metrics (storage/connection pool, catalog, sessions)."""
+    return jsonify({
+        "storage": STORAGE.name,
+        "pool": STORAGE.metrics(),
+        "catalog": CATALOG_RELOADER.metrics(),
+        "leaderboard": LEADERBOARD_RELOADER.metrics(),
+        "sessions": len(SESSIONS),
+        "score_writer": dict(SCORE_WRITER.stats, pending=SCORE_WRITER.pending()),
+    })
+
+# --- Startup ---
+def warm_caches():
+    """Load the in-memory caches up front so the first player doesn't pay for it."""
+    try:
+        get_catalog()
+        for period in LEADERBOARD_PERIODS:
+            get_leaderboard_cache(period)
+        get_rank_index()
+    except StorageError as e:
+        print(f"Database error while warming caches: {e}")
+
+
+warm_caches()
 
 # --- Main execution point ---
 if __name__ == '__main__':
@@ -0,0 +1,224 @@
+"""The question catalog: the playable rows of the questions table, held in memory.
+
+QuestionCatalog is built from database rows in each process. MappedCatalog
+reads the same data from a prebuilt catalog file (see write_catalog_file)
+through a read-only mmap, so every web worker shares one page-cache copy and
+starts without querying the database. Build or rebuild the file with:
+
+    python catalog.py build [--out catalog.bin]
+
+The new file replaces the old one atomically. Processes that already mapped
+the old file keep reading it until they load the catalog again.
+"""
+import os
+import sys
+import mmap
+import time
+import struct
+import random
+import hashlib
+import argparse
+from array import array
+from collections.abc import Sequence
+
+WRONG_ANSWERS = 7
+CATALOG_FILE = os.environ.get('CATALOG_FILE', '')
+
+
+class QuestionCatalog:
+    """Compact, immutable snapshot of the playable rows of the questions table."""
+
+    TYPES = ('movie', 'tv')
+    version = None   # what the catalog was built from, see app.catalog_source_version()
+
+    def __init__(self, rows):
+        self.ids = array('i')
+        self.types = bytearray()
+        self.titles = []
+        self.filenames = []
+        self.variants = []   # JSON {"webp": [480, 960, ...]} from fetch-images.py, or None
+        self.placeholders = []   # base64 blur-up JPEG, or None
+        self.colors = []         # '#rrggbb' average color, or None
+        for row in rows:
+            self.ids.append(row['tmdbid'])
+            self.types.append(self.TYPES.index(row['type']))
+            self.titles.append(sys.intern(row['title']))
+            self.filenames.append(row['filename'])
+            self.variants.append(sys.intern(row['variants']) if row.get('variants') else None)
+            self.placeholders.append(row.get('placeholder') or None)
+            self.colors.append(sys.intern(row['color']) if row.get('color') else None)
+        # Distinct titles, so distractors never repeat (remakes share a title)
+        self.unique_titles = list(dict.fromkeys(self.titles))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def random_index(self, exclude_ids=()):
+        """Pick a random question index whose tmdbid is not in exclude_ids."""
+        count = len(self.ids)
+        if not count:
+            return None
+        # Rejection sampling is O(1) while most of the catalog is still unseen
+        for _ in range(32):
+            index = random.randrange(count)
+            if self.ids[index] not in exclude_ids:
+                return index
+        remaining = [i for i in range(count) if self.ids[i] not in exclude_ids]
+        return random.choice(remaining) if remaining else None
+
+    def distractors(self, correct_answer, count=WRONG_ANSWERS):
+        """Return `count` distinct titles different from the correct answer."""
+        sample = random.sample(self.unique_titles, min(count + 1, len(self.unique_titles)))
+        return [title for title in sample if title != correct_answer][:count]
+
+
+# --- Catalog File ---
+# Little-endian, every section 4-byte aligned so it can be cast in place:
+#   header   magic, row count, string count, distinct title count, 16-byte content digest
+#   ids      int32 per row
+#   types    uint8 per row (index into QuestionCatalog.TYPES), padded
+#   title, filename, variants, placeholder, color
+#            uint32 per row each: index into the string table, NO_STRING for None
+#   unique   uint32 string index per distinct title
+#   offsets  uint32 per string + 1: where each string starts in the blob
+#   blob     the UTF-8 strings, each stored once
+MAGIC = b'TGCATLG1'
+HEADER = struct.Struct('<8sIII16s')
+NO_STRING = 0xFFFFFFFF
+STRING_COLUMNS = ('titles', 'filenames', 'variants', 'placeholders', 'colors')
+
+
+def _padded(data):
+    return data + bytes(-len(data) % 4)
+
+
+def _le_bytes(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_catalog_file(path, rows):
+    """Compile question rows into a catalog file at `path`, replacing any old one atomically."""
+    catalog = QuestionCatalog(rows)
+    strings, index = [], {}
+
+    def intern(value):
+        if value is None:
+            return NO_STRING
+        if value not in index:
+            index[value] = len(strings)
+            strings.append(value.encode('utf-8'))
+        return index[value]
+
+    columns = [array('I', (intern(value) for value in getattr(catalog, name))) for name in STRING_COLUMNS]
+    unique = array('I', (index[title] for title in catalog.unique_titles))
+    offsets = array('I', [0])
+    for data in strings:
+        offsets.append(offsets[-1] + len(data))
+
+    body = b''.join([
+        _le_bytes(array('i', catalog.ids)),
+        _padded(bytes(catalog.types)),
+        *(_le_bytes(column) for column in columns),
+        _le_bytes(unique),
+        _le_bytes(offsets),
+        b''.join(strings),
+    ])
+    digest = hashlib.sha256(body).digest()[:16]
+    header = HEADER.pack(MAGIC, len(catalog), len(strings), len(unique), digest)
+
+    # Write next to the target and rename over it: readers see the old file or the new one, never half of one
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hex()
+
+
+class _StringColumn(Sequence):
+    """Read-only sequence of the strings (or None) one uint32 column points at."""
+
+    __slots__ = ('_refs', '_offsets', '_blob')
+
+    def __init__(self, refs, offsets, blob):
+        self._refs = refs
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._refs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._refs)))]
+        ref = self._refs[index]
+        if ref == NO_STRING:
+            return None
+        return str(self._blob[self._offsets[ref]:self._offsets[ref + 1]], 'utf-8')
+
+
+class MappedCatalog(QuestionCatalog):
+    """QuestionCatalog served straight from a memory-mapped catalog file."""
+
+    def __init__(self, path):
+        if sys.byteorder == 'big':
+            raise ValueError("Catalog files are little-endian")
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        view = memoryview(self._map)
+        if len(view) < HEADER.size:
+            raise ValueError(f"{path} is not a catalog file")
+        magic, count, string_count, unique_count, digest = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog file")
+        self.version = digest.hex()
+
+        position = HEADER.size
+
+        def section(size, fmt):
+            nonlocal position
+            start, position = position, position + size
+            if position > len(view):
+                raise ValueError(f"{path} is truncated")
+            return view[start:position].cast(fmt)
+
+        self.ids = section(4 * count, 'i')
+        self.types = section(count, 'B')
+        position += -count % 4
+        refs = [section(4 * count, 'I') for _ in STRING_COLUMNS]
+        unique = section(4 * unique_count, 'I')
+        offsets = section(4 * (string_count + 1), 'I')
+        blob = view[position:position + offsets[-1]]
+        if len(blob) != offsets[-1]:
+            raise ValueError(f"{path} is truncated")
+        for name, column in zip(STRING_COLUMNS, refs):
+            setattr(self, name, _StringColumn(column, offsets, blob))
+        self.unique_titles = _StringColumn(unique, offsets, blob)
+
+
+if __name__ == '__main__':
+    from storage import open_storage, StorageError
+
+    parser = argparse.ArgumentParser(description="Question catalog tools.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="Compile the playable questions from storage into a catalog file.")
+    build.add_argument('--out', default=CATALOG_FILE or 'catalog.bin', help="Catalog file to write (default: %(default)s)")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    try:
+        rows = open_storage().load_questions()
+    except StorageError as e:
+        sys.exit(f"Could not read the questions: {e}")
+    version = write_catalog_file(args.out, rows)
+    print(f"{args.out}: {len(rows)} questions, version {version}, "
+          f"{os.path.getsize(args.out)} bytes in {time.perf_counter() - started:.2f}s")
@@ -2,21 +2,43 @@
 # fetch_question_images.py
 # - Reads unique URLs from thegame.questions
 # - If images/<filename> exists (non-empty) -> skip download, but still set filename in DB
+# - images/manifest.json remembers per URL the file's size, dimensions, hash, ETag/Last-Modified
+#   and derived outputs, so a re-run only touches new or changed URLs (--revalidate asks the
+#   server with conditional requests) and DB updates go out in one transaction at the end
+# - Downloads go through the shared on-disk HTTP cache (Resources/tmdb_http.py)
 # - Else download, resize to height 720px with ImageMagick, save to images/<filename>
 # - Update questions.filename (no directory)
+# - Build a ladder of smaller WebP/AVIF variants next to it (images/variants/<name>-<width>w.<fmt>)
+#   and record the widths per format in questions.variants (JSON)
+# - Build a small thumbnail (images/thumbs/<name>.jpg) for the end-of-game summary sprite
+# - Store a tiny blurred placeholder (base64 JPEG) and the average color in questions.placeholder/color
+# - --pipelined runs downloads (threads), resizing (processes) and DB writes (one writer) concurrently
+# - --reconcile diffs the image folders against questions.filename: reports orphaned files
+#   (--gc deletes them) and sets questions.playable = 0 where the image is missing or corrupt
+# - --backend picks ImageMagick (subprocess) or Pillow (in-process); --benchmark compares the two
 
 import os
 import sys
 import logging
 import time
 import shutil
+import io
+import json
+import base64
+import hashlib
+import tempfile
+import argparse
 import subprocess
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-import requests
 import pymysql
 from typing import Optional
 
+# Shared HTTP session (Resources/tmdb_http.py), so TMDB_OFFLINE=1 applies to the image downloads too
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Resources"))
+from tmdb_http import CachedSession, OfflineCacheMiss
+
 # ---------- CONFIG ----------
 MYSQL = dict(host="localhost", user="dimme", password="Telenet00", port=3306, database="thegame")
 IMAGES_DIR = "static\images"   # will be created if missing
@@ -24,6 +46,44 @@ HTTP_TIMEOUT = 60
 RETRIES = 3
 BACKOFF = 1.5  # exponential backoff base (1.0, 1.5, 2.25, ...)
 
+# The master every question shows: -resize x720 -quality 90
+MASTER_HEIGHT = 720
+MASTER_QUALITY = 90
+
+# Responsive variants: widths to build (never upscaled past the 720p master) and
+# formats to try, best first. AVIF is skipped if this ImageMagick can't write it.
+VARIANTS_DIR = os.path.join(IMAGES_DIR, "variants")
+VARIANT_WIDTHS = (480, 960, 1280)
+VARIANT_FORMATS = ("avif", "webp")
+VARIANT_QUALITY = {"avif": 50, "webp": 80}
+
+# Thumbnails for the game summary; the app stitches them into one sprite per game
+THUMBS_DIR = os.path.join(IMAGES_DIR, "thumbs")
+THUMB_SIZE = (160, 90)
+THUMB_QUALITY = 70
+
+# Inline placeholder (LQIP) shown while the real image loads: a few hundred bytes
+PLACEHOLDER_WIDTH = 24
+PLACEHOLDER_QUALITY = 30
+# questions.placeholder is VARCHAR(PLACEHOLDER_MAX_CHARS). Busy images that come out bigger are
+# rebuilt with these (width, quality) in turn, then stored without one (the color still shows).
+PLACEHOLDER_MAX_CHARS = 2048
+PLACEHOLDER_FALLBACKS = ((24, 15), (16, 15), (12, 10))
+
+# Sync state per URL; rows are only rewritten when they differ from it
+MANIFEST_PATH = os.path.join(IMAGES_DIR, "manifest.json")
+DB_BATCH_SIZE = 500
+
+# Columns added to questions after it was first created (name -> definition)
+QUESTION_COLUMNS = {
+    "variants": "VARCHAR(255) NULL",
+    "placeholder": f"VARCHAR({PLACEHOLDER_MAX_CHARS}) NULL",
+    "color": "CHAR(7) NULL",
+    "playable": "TINYINT(1) NOT NULL DEFAULT 1",
+}
+# Columns created narrower by older versions: name -> minimum length
+WIDENED_COLUMNS = {"placeholder": PLACEHOLDER_MAX_CHARS}
+
 # ---------- LOGGING ----------
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 log = logging.getLogger("fetch-images")
@@ -41,33 +101,28 @@ def connect():
         cursorclass=pymysql.cursors.Cursor,
     )
 
-# ---------- ImageMagick detection ----------
-def detect_imagemagick() -> Optional[str]:
-    # Prefer 'magick' (Windows/newer IM), else 'convert' (Linux/macOS)
-    for exe in ("magick", "convert"):
-        path = shutil.which(exe)
-        if path:
-            return exe
-    return None
-
-IM_BIN = detect_imagemagick()
-if not IM_BIN:
-    log.error("ImageMagick not found. Install it or add it to PATH. "
-              "On Windows, install from imagemagick.org and ensure 'magick.exe' is in PATH.")
-    sys.exit(1)
-
 # ---------- HTTP ----------
-SESSION = requests.Session()
+# Image files bypass the HTTP cache (the masters in static/images are the copy that matters and
+# downloads keep streaming), so under TMDB_OFFLINE=1 only images already on disk can be processed
+SESSION = CachedSession()
 
-def http_get_with_retries(url: str):
+def http_get_with_retries(url: str, headers: Optional[dict] = None):
+    # Retries network errors, 429 and 5xx; offline cache misses and other 4xx fail straight away
     last_err = None
     for attempt in range(1, RETRIES + 1):
         try:
-            r = SESSION.get(url, stream=True, timeout=HTTP_TIMEOUT)
+            r = SESSION.get(url, stream=True, timeout=HTTP_TIMEOUT, headers=headers)
             r.raise_for_status()
             return r
+        except OfflineCacheMiss:
+            raise
         except Exception as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status is not None and status < 500 and status != 429:
+                raise
             last_err = e
+            if attempt == RETRIES:
+                break
             wait = BACKOFF ** (attempt - 1)
             log.warning("GET failed (attempt %d/%d) %s ; retry in %.1fs", attempt, RETRIES, e, wait)
             time.sleep(wait)
@@ -88,11 +143,256 @@ def make_src_name(final_path: str) -> str:
     base, ext = os.path.splitext(final_path)
     return f"{base}.src{ext}"
 
-def resize_to_height_720(src_path: str, dst_path: str):
-    # Use ImageMagick to resize by height, keep aspect ratio, auto-orient and strip metadata
-    # Command pattern works for both 'magick' and 'convert'
-    cmd = [IM_BIN, src_path, "-auto-orient", "-resize", "x720", "-strip", "-quality", "90", dst_path]
-    subprocess.run(cmd, check=True)
+def variant_name(fname: str, width: int, fmt: str) -> str:
+    # abc123.jpg -> abc123-480w.webp (the app rebuilds the same names from questions.variants)
+    return f"{os.path.splitext(fname)[0]}-{width}w.{fmt}"
+
+def thumb_name(fname: str) -> str:
+    return f"{os.path.splitext(fname)[0]}.jpg"
+
+# ---------- Resize backends ----------
+# Both backends produce the same files: 'magick' shells out to ImageMagick (the original
+# pipeline), 'pillow' decodes and encodes in-process, which avoids one process start per
+# image and works on machines without ImageMagick. Each derived output is
+# (kind, size, fmt, quality, dst): kind "width" scales to size[0] wide, "cover" fills
+# size exactly and crops the overflow around the center.
+
+class MagickBackend:
+    name = "magick"
+
+    def __init__(self):
+        self.bin = detect_imagemagick()
+        if not self.bin:
+            raise RuntimeError("ImageMagick not found. Install it or add it to PATH. "
+                               "On Windows, install from imagemagick.org and ensure 'magick.exe' is in PATH.")
+
+    def writable_formats(self, formats) -> list:
+        # 'magick -list format' marks writable formats with 'w' in the mode column, e.g. "AVIF* HEIC rw+"
+        try:
+            out = subprocess.run([self.bin, "-list", "format"], check=True, capture_output=True, text=True).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return []
+        writable = set()
+        for line in out.splitlines():
+            parts = line.split()
+            if len(parts) >= 3 and "w" in parts[2]:
+                writable.add(parts[0].rstrip("*").lower())
+        return [fmt for fmt in formats if fmt in writable]
+
+    def resize_to_height(self, src_path: str, dst_path: str, height: int = 720, quality: int = 90):
+        # Use ImageMagick to resize by height, keep aspect ratio, auto-orient and strip metadata
+        # Command pattern works for both 'magick' and 'convert'
+        cmd = [self.bin, src_path, "-auto-orient", "-resize", f"x{height}", "-strip", "-quality", str(quality), dst_path]
+        subprocess.run(cmd, check=True)
+
+    def dimensions(self, path: str):
+        cmd = [self.bin, "identify"] if self.bin == "magick" else ["identify"]
+        out = subprocess.run(cmd + ["-format", "%w %h ", path], check=True, capture_output=True, text=True).stdout
+        w, h = out.split()[:2]
+        return int(w), int(h)
+
+    def check(self, path: str):
+        # identify decodes the whole file; -regard-warnings turns truncation warnings into a failure
+        cmd = [self.bin, "identify"] if self.bin == "magick" else ["identify"]
+        subprocess.run(cmd + ["-regard-warnings", "-format", "%w", path], check=True, capture_output=True)
+
+    def derive(self, master_path: str, outputs):
+        # One call for all outputs: the master is decoded once and each
+        # (+clone ... -write ... +delete) step resizes a copy of it.
+        cmd = [self.bin, master_path, "-auto-orient", "-strip"]
+        for kind, (w, h), fmt, quality, dst in outputs:
+            if kind == "cover":
+                resize = ["-resize", f"{w}x{h}^", "-gravity", "center", "-extent", f"{w}x{h}"]
+            else:
+                resize = ["-resize", f"{w}x"]
+            cmd += ["(", "+clone", *resize, "-quality", str(quality), "-write", f"{fmt}:{dst}", "+delete", ")"]
+        subprocess.run(cmd + ["null:"], check=True)
+
+    def placeholder(self, master_path: str, width: int, quality: int):
+        # Write the tiny JPEG, then shrink that to 1x1 and print its (average) color
+        tmp = master_path + ".lqip"
+        try:
+            out = subprocess.run([self.bin, master_path, "-auto-orient", "-strip",
+                                  "-resize", f"{width}x", "-quality", str(quality),
+                                  "-write", f"jpg:{tmp}", "-resize", "1x1!", "-format", "%[hex:u.p{0,0}]", "info:"],
+                                 check=True, capture_output=True, text=True).stdout
+            with open(tmp, "rb") as f:
+                return f.read(), "#" + out.strip()[:6].lower()
+        finally:
+            remove_quietly(tmp)
+
+class PillowBackend:
+    name = "pillow"
+    PIL_FORMATS = {"jpg": "JPEG", "webp": "WEBP", "avif": "AVIF"}
+
+    def __init__(self):
+        try:
+            from PIL import Image, ImageOps, features
+        except ImportError:
+            raise RuntimeError("Pillow not installed (pip install pillow).")
+        self.Image, self.ImageOps, self.features = Image, ImageOps, features
+
+    def writable_formats(self, formats) -> list:
+        available = []
+        for fmt in formats:
+            try:
+                if self.features.check(fmt):
+                    available.append(fmt)
+            except ValueError:
+                pass
+        return available
+
+    def _open(self, path: str, size=None):
+        # Decode (JPEG: straight at the smallest DCT scale still >= size) and apply EXIF orientation
+        im = self.Image.open(path)
+        if size and im.format == "JPEG":
+            w, h = size
+            if im.getexif().get(0x0112, 1) in (5, 6, 7, 8):   # rotated 90°: draft in stored orientation
+                w, h = h, w
+            im.draft("RGB", (w, h))
+        source_format = im.format
+        im = self.ImageOps.exif_transpose(im)
+        return (im if im.mode in ("RGB", "L") else im.convert("RGB")), source_format
+
+    def _save(self, im, dst_path: str, fmt: str, quality: int):
+        # No exif/icc_profile passed: metadata is stripped like IM's -strip.
+        # IM uses 4:4:4 chroma at quality >= 90 and 4:2:0 below; match that.
+        options = {"quality": quality}
+        if fmt == "JPEG":
+            options["subsampling"] = 0 if quality >= 90 else 2
+        im.save(dst_path, format=fmt, **options)
+
+    def _scaled_size(self, path: str, width=None, height=None):
+        with self.Image.open(path) as im:
+            w, h = im.size
+            if im.format == "JPEG" and im.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                w, h = h, w
+        if height:
+            return max(1, round(w * height / h)), height
+        return width, max(1, round(h * width / w))
+
+    def resize_to_height(self, src_path: str, dst_path: str, height: int = 720, quality: int = 90):
+        size = self._scaled_size(src_path, height=height)
+        im, source_format = self._open(src_path, size)
+        with im:
+            self._save(im.resize(size, self.Image.LANCZOS), dst_path, source_format or "JPEG", quality)
+
+    def dimensions(self, path: str):
+        with self.Image.open(path) as im:
+            w, h = im.size
+            return (h, w) if im.getexif().get(0x0112, 1) in (5, 6, 7, 8) else (w, h)
+
+    def check(self, path: str):
+        # Full decode: raises on unknown formats and truncated files
+        with self.Image.open(path) as im:
+            im.load()
+
+    def derive(self, master_path: str, outputs):
+        im, _ = self._open(master_path)
+        with im:
+            for kind, (w, h), fmt, quality, dst in outputs:
+                if kind == "cover":
+                    out = self.ImageOps.fit(im, (w, h), self.Image.LANCZOS)
+                else:
+                    out = im.resize((w, max(1, round(im.height * w / im.width))), self.Image.LANCZOS)
+                self._save(out, dst, self.PIL_FORMATS[fmt], quality)
+
+    def placeholder(self, master_path: str, width: int, quality: int):
+        im, _ = self._open(master_path, (width, 1))
+        with im:
+            small = im.resize((width, max(1, round(im.height * width / im.width))), self.Image.LANCZOS)
+            buf = io.BytesIO()
+            self._save(small, buf, "JPEG", quality)
+            r, g, b = small.convert("RGB").resize((1, 1), self.Image.BOX).getpixel((0, 0))
+            return buf.getvalue(), f"#{r:02x}{g:02x}{b:02x}"
+
+def detect_imagemagick() -> Optional[str]:
+    # Prefer 'magick' (Windows/newer IM), else 'convert' (Linux/macOS)
+    for exe in ("magick", "convert"):
+        path = shutil.which(exe)
+        if path:
+            return exe
+    return None
+
+BACKENDS = {"magick": MagickBackend, "pillow": PillowBackend}
+_backend_cache = {}
+
+def get_backend(name: str = "auto"):
+    # One instance per process (worker processes build their own). 'auto' prefers
+    # ImageMagick, the reference output, and falls back to Pillow.
+    if name not in _backend_cache:
+        if name == "auto":
+            backend = get_backend("magick" if detect_imagemagick() else "pillow")
+        else:
+            backend = BACKENDS[name]()
+            backend.formats = backend.writable_formats(VARIANT_FORMATS)
+            if len(backend.formats) < len(VARIANT_FORMATS):
+                log.warning("%s can't write %s; building only %s variants.", backend.name,
+                            ", ".join(sorted(set(VARIANT_FORMATS) - set(backend.formats))),
+                            ", ".join(backend.formats) or "no")
+        _backend_cache[name] = backend
+    return _backend_cache[name]
+
+def resize_to_height_720(src_path: str, dst_path: str, backend: str = "auto"):
+    get_backend(backend).resize_to_height(src_path, dst_path, MASTER_HEIGHT, MASTER_QUALITY)
+
+def build_variants(master_path: str, fname: str, backend: str = "auto") -> dict:
+    # Builds the missing variants and the thumbnail in one backend pass.
+    # Returns {"avif": [480, 960], "webp": [480, 960, 1280]} for the variants on disk.
+    engine = get_backend(backend)
+    widths = [w for w in VARIANT_WIDTHS if w <= engine.dimensions(master_path)[0]]
+    outputs = []
+    thumb = os.path.join(THUMBS_DIR, thumb_name(fname))
+    if not file_exists_nonempty(thumb):
+        outputs.append(("cover", THUMB_SIZE, "jpg", THUMB_QUALITY, thumb))
+    for fmt in engine.formats:
+        for w in widths:
+            dst = os.path.join(VARIANTS_DIR, variant_name(fname, w, fmt))
+            if not file_exists_nonempty(dst):
+                outputs.append(("width", (w, 0), fmt, VARIANT_QUALITY[fmt], dst))
+    if outputs:
+        # Write to .resized temp names, then move into place
+        temps = [(kind, size, fmt, quality, f"{dst}.resized") for kind, size, fmt, quality, dst in outputs]
+        try:
+            engine.derive(master_path, temps)
+            for (*_, tmp), (*_, dst) in zip(temps, outputs):
+                os.replace(tmp, dst)
+        finally:
+            remove_quietly(*(tmp for *_, tmp in temps))
+    return {fmt: widths for fmt in engine.formats if widths}
+
+def build_placeholder(master_path: str, backend: str = "auto"):
+    # Returns (base64 JPEG, "#rrggbb"); the JPEG is None if not even the smallest one fits the column
+    engine = get_backend(backend)
+    for width, quality in ((PLACEHOLDER_WIDTH, PLACEHOLDER_QUALITY),) + PLACEHOLDER_FALLBACKS:
+        data, color = engine.placeholder(master_path, width, quality)
+        encoded = base64.b64encode(data).decode("ascii")
+        if len(encoded) <= PLACEHOLDER_MAX_CHARS:
+            return encoded, color
+    log.warning("Placeholder for %s is over %d characters even at %dpx; storing only its color.",
+                master_path, PLACEHOLDER_MAX_CHARS, width)
+    return None, color
+
+def placeholder_fits(placeholder: Optional[str]) -> bool:
+    return not placeholder or len(placeholder) <= PLACEHOLDER_MAX_CHARS
+
+def has_placeholder(entry: dict) -> bool:
+    # Built (the color is always set) and storable; oversized ones from older runs are rebuilt
+    return bool(entry.get("color")) and placeholder_fits(entry.get("placeholder"))
+
+def ensure_columns(cur):
+    # Columns added to questions after the table was first created; add any that are missing
+    # and widen the ones an older version created too small
+    cur.execute("SELECT COLUMN_NAME, CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'questions'")
+    existing = {row[0].lower(): row[1] for row in cur.fetchall()}
+    for name, definition in QUESTION_COLUMNS.items():
+        if name not in existing:
+            log.info("Adding questions.%s column.", name)
+            cur.execute(f"ALTER TABLE questions ADD COLUMN `{name}` {definition}")
+        elif name in WIDENED_COLUMNS and (existing[name] or 0) < WIDENED_COLUMNS[name]:
+            log.info("Widening questions.%s to %s.", name, definition)
+            cur.execute(f"ALTER TABLE questions MODIFY COLUMN `{name}` {definition}")
 
 def file_exists_nonempty(path: str) -> bool:
     try:
@@ -100,100 +400,557 @@ def file_exists_nonempty(path: str) -> bool:
     except OSError:
         return False
 
-def main():
-    os.makedirs(IMAGES_DIR, exist_ok=True)
+def remove_quietly(*paths):
+    for p in paths:
+        try:
+            if os.path.exists(p):
+                os.remove(p)
+        except OSError:
+            pass
 
-    with connect() as cnx, cnx.cursor() as cur:
-        # Get unique URLs (you can add "AND (filename IS NULL OR filename='')" to process only missing files)
-        cur.execute("SELECT DISTINCT url FROM questions WHERE url IS NOT NULL AND url <> ''")
-        urls = [row[0] for row in cur.fetchall()]
-        total = len(urls)
-        log.info("Found %d unique URLs to evaluate.", total)
-
-        processed = 0
-        for url in urls:
-            fname = filename_from_url(url)
-            if not fname:
-                log.warning("Skipping URL without filename: %s", url)
-                continue
-
-            out_path = os.path.join(IMAGES_DIR, fname)
-            need_download = not file_exists_nonempty(out_path)
+def download(url: str, out_path: str, validators: Optional[dict] = None):
+    # Download to <name>.part, then rename to <name>.src.<ext> so IM sees the correct
+    # format (prevents PART decoder issue). With validators (etag/last_modified from the
+    # manifest) the request is conditional. Returns (.src path, validators), or
+    # (None, validators) when the server answers 304 Not Modified.
+    tmp_part = out_path + ".part"
+    src_path = make_src_name(out_path)
+    tmp_resized = out_path + ".resized"
+    remove_quietly(tmp_part, src_path, tmp_resized)  # clean any stale temp files
+    headers = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    try:
+        r = http_get_with_retries(url, headers)
+        if r.status_code == 304:
+            r.close()
+            return None, validators
+        with open(tmp_part, "wb") as f:
+            for chunk in r.iter_content(chunk_size=1024 * 256):
+                if chunk:
+                    f.write(chunk)
+        os.replace(tmp_part, src_path)
+        return src_path, {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    except BaseException:
+        remove_quietly(tmp_part, src_path)
+        raise
+
+def derived_paths(fname: str) -> list:
+    # Every file build_variants can produce for this master
+    paths = [os.path.join(THUMBS_DIR, thumb_name(fname))]
+    paths += [os.path.join(VARIANTS_DIR, variant_name(fname, w, fmt)) for fmt in VARIANT_FORMATS for w in VARIANT_WIDTHS]
+    return paths
 
+def file_info(path: str, backend: str = "auto") -> dict:
+    # What the manifest keeps about a master: size/mtime to spot local changes without
+    # reading the file, plus dimensions and a content hash
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    st = os.stat(path)
+    width, height = get_backend(backend).dimensions(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "width": width, "height": height,
+            "sha256": digest.hexdigest()}
+
+def process_image(fname: str, out_path: str, src_path: Optional[str], need_placeholder: bool,
+                  backend: str = "auto") -> dict:
+    # CPU stage: resize a fresh download into place, then build variants, thumbnail and
+    # placeholder. Runs in a worker process in pipelined mode, so it only takes plain args.
+    if src_path:
+        tmp_resized = out_path + ".resized"
+        try:
+            # Resize into .resized, then atomically move to final
+            resize_to_height_720(src_path, tmp_resized, backend)
+            os.replace(tmp_resized, out_path)
+        finally:
+            remove_quietly(src_path, tmp_resized)
+        # A new master makes any earlier variants/thumbnail stale
+        remove_quietly(*derived_paths(fname))
+    else:
+        # Reuse an existing master only if it decodes; otherwise the next run downloads it again
+        try:
+            get_backend(backend).check(out_path)
+        except Exception:
+            remove_quietly(out_path)
+            raise
+
+    result = {"fname": fname, "variants": {}, "placeholder": None, "color": None,
+              "file": file_info(out_path, backend)}
+    # Responsive variants (only the missing ones are built)
+    try:
+        result["variants"] = build_variants(out_path, fname, backend)
+    except (subprocess.CalledProcessError, ValueError, OSError) as e:
+        log.error("Building variants failed for %s : %s", out_path, e)
+    if need_placeholder:
+        try:
+            result["placeholder"], result["color"] = build_placeholder(out_path, backend)
+        except (subprocess.CalledProcessError, OSError) as e:
+            log.error("Building placeholder failed for %s : %s", out_path, e)
+    return result
+
+class Progress:
+    def __init__(self, total: int, every: int = 25, interval: float = 10.0):
+        self.total, self.every, self.interval = total, every, interval
+        self.done = self.failed = 0
+        self.started = self.last_log = time.monotonic()
+
+    def tick(self, ok: bool = True):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        now = time.monotonic()
+        if self.done % self.every == 0 or self.done == self.total or now - self.last_log >= self.interval:
+            self.last_log = now
+            rate = self.done / max(now - self.started, 1e-6)
+            eta = (self.total - self.done) / rate if rate else 0
+            log.info("Progress: %d/%d URLs processed (%d failed), %.1f/s, ETA %.0fs",
+                     self.done, self.total, self.failed, rate, eta)
+
+# ---------- Manifest ----------
+def load_manifest() -> dict:
+    # url -> {filename, size, mtime_ns, width, height, sha256, etag, last_modified, variants, placeholder, color}
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable manifest %s : %s", MANIFEST_PATH, e)
+        return {}
+
+def save_manifest(manifest: dict):
+    # Write to .tmp, then atomically replace, so an interrupted run never leaves half a file
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+def scan_dir(path: str) -> dict:
+    # name -> (size, mtime_ns) for a whole folder: one scandir instead of a stat per URL
+    files = {}
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                if e.is_file():
+                    st = e.stat()
+                    files[e.name] = (st.st_size, st.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return files
+
+def manifest_entry(result: dict, validators: Optional[dict], previous: Optional[dict], fallback=(None, None)) -> dict:
+    # Merge a processed result into the URL's manifest entry; placeholder/color are kept
+    # from the previous entry (or the DB) when this run didn't rebuild them
+    entry = {"filename": result["fname"], **result["file"], "variants": result["variants"]}
+    entry["etag"] = (validators or {}).get("etag")
+    entry["last_modified"] = (validators or {}).get("last_modified")
+    placeholder, color = result["placeholder"], result["color"]
+    if not color and previous:   # not rebuilt this run
+        placeholder, color = previous.get("placeholder"), previous.get("color")
+    if not color:
+        placeholder, color = fallback
+    entry["placeholder"], entry["color"] = placeholder, color
+    return entry
+
+def db_values(entry: dict) -> tuple:
+    # (filename, variants, placeholder, color, playable) as stored in questions
+    variants = entry.get("variants")
+    placeholder = entry.get("placeholder")
+    return (entry["filename"], json.dumps(variants, separators=(",", ":"), sort_keys=True) if variants else None,
+            placeholder if placeholder_fits(placeholder) else None, entry.get("color"), 1)
+
+def is_current(entry: dict, fname: str, masters: dict, variants: dict, thumbs: dict) -> bool:
+    # Manifest entry matches the master on disk and all its derived files exist
+    if entry.get("filename") != fname or masters.get(fname) != (entry.get("size"), entry.get("mtime_ns")):
+        return False
+    if thumb_name(fname) not in thumbs or not has_placeholder(entry):
+        return False
+    return all(variant_name(fname, w, fmt) in variants
+               for fmt, widths in (entry.get("variants") or {}).items() for w in widths)
+
+def plan_jobs(urls, manifest: dict, placeholders: dict, revalidate: bool = False):
+    # Returns (jobs, current). jobs: (url, fname, out_path, need_download, need_placeholder, validators)
+    # for URLs with work to do; current: URLs whose manifest entry already matches the disk.
+    masters, variants, thumbs = scan_dir(IMAGES_DIR), scan_dir(VARIANTS_DIR), scan_dir(THUMBS_DIR)
+    jobs, current = [], []
+    for url in urls:
+        fname = filename_from_url(url)
+        if not fname:
+            log.warning("Skipping URL without filename: %s", url)
+            continue
+        out_path = os.path.join(IMAGES_DIR, fname)
+        entry = manifest.get(url)
+        on_disk = masters.get(fname)
+        if entry and on_disk and entry.get("filename") == fname and on_disk != (entry.get("size"), entry.get("mtime_ns")):
+            # Touched or replaced locally: same hash only refreshes the stat fields, a
+            # different one (edited, truncated) means fetching the master again
+            try:
+                info = file_info(out_path) if entry.get("sha256") else {}
+            except (OSError, RuntimeError, subprocess.CalledProcessError):
+                info = {}
+            if info.get("sha256") == entry.get("sha256"):
+                entry.update(info)
+            else:
+                log.info("Changed on disk, downloading again: %s", out_path)
+                on_disk = None
+                entry = manifest[url] = {**entry, "size": None, "placeholder": None, "color": None}
+        if entry and is_current(entry, fname, masters, variants, thumbs):
+            if revalidate:
+                jobs.append((url, fname, out_path, True, False,
+                             {"etag": entry.get("etag"), "last_modified": entry.get("last_modified")}))
+            else:
+                current.append(url)
+            continue
+        need_download = not on_disk or on_disk[0] == 0
+        if not need_download:
+            log.info("Exists, skipping download: %s", out_path)
+        placeholder_ok = has_placeholder(entry) if entry else url in placeholders
+        validators = None if need_download else {"etag": (entry or {}).get("etag"),
+                                                 "last_modified": (entry or {}).get("last_modified")}
+        jobs.append((url, fname, out_path, need_download, need_download or not placeholder_ok, validators))
+    return jobs, current
+
+def run_sequential(jobs, write, progress, backend: str):
+    # One URL at a time: download, resize, write
+    for url, fname, out_path, need_download, need_placeholder, validators in jobs:
+        try:
+            src_path = None
             if need_download:
-                tmp_part = out_path + ".part"
-                src_path = make_src_name(out_path)
-                tmp_resized = out_path + ".resized"
-
-                # Clean any stale temp files
-                for p in (tmp_part, src_path, tmp_resized):
-                    try:
-                        if os.path.exists(p):
-                            os.remove(p)
-                    except OSError:
-                        pass
+                src_path, validators = download(url, out_path, validators)
+            result = process_image(fname, out_path, src_path, need_placeholder, backend)
+        except subprocess.CalledProcessError as e:
+            # Do not update DB on failure; continue
+            log.error("ImageMagick failed for %s : %s", url, e)
+            progress.tick(ok=False)
+            continue
+        except Exception as e:
+            log.error("Failed processing %s : %s", url, e)
+            progress.tick(ok=False)
+            continue
+        if src_path:
+            log.info("Downloaded & resized -> %s", out_path)
+        progress.tick(ok=write(url, result, validators))
 
-                try:
-                    # Download to .part
-                    r = http_get_with_retries(url)
-                    with open(tmp_part, "wb") as f:
-                        for chunk in r.iter_content(chunk_size=1024 * 256):
-                            if chunk:
-                                f.write(chunk)
+def run_pipelined(jobs, write, progress, backend: str, download_workers: int, resize_workers: int):
+    # Three stages: a thread pool downloads, a process pool resizes (ImageMagick work),
+    # and this thread is the single DB writer. Downloads are only started while the
+    # resize backlog is small, so finished .src files don't pile up on disk.
+    pending_jobs = list(reversed(jobs))
+    backlog = max(2, resize_workers * 2)
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=resize_workers) as resizes:
+        in_flight = {}   # future -> (stage, job, validators)
+        downloaded = set()   # URLs with a fresh download (not a 304) being resized
 
-                    # Rename .part -> .src.<ext> so IM sees the correct format (prevents PART decoder issue)
-                    os.replace(tmp_part, src_path)
+        def start_downloads():
+            resizing = sum(1 for stage, _, _ in in_flight.values() if stage == "resize")
+            downloading = len(in_flight) - resizing
+            while pending_jobs and downloading < download_workers and resizing + downloading < backlog + download_workers:
+                job = pending_jobs.pop()
+                url, _, out_path, need_download, _, validators = job
+                future = downloads.submit(download, url, out_path, validators) if need_download else None
+                if future is None:
+                    start_resize(job, None, validators)
+                    resizing += 1
+                else:
+                    in_flight[future] = ("download", job, None)
+                    downloading += 1
 
-                    # Resize into .resized, then atomically move to final
-                    resize_to_height_720(src_path, tmp_resized)
-                    os.replace(tmp_resized, out_path)
+        def start_resize(job, src_path, validators):
+            _, fname, out_path, _, need_placeholder, _ = job
+            future = resizes.submit(process_image, fname, out_path, src_path, need_placeholder, backend)
+            in_flight[future] = ("resize", job, validators)
 
-                    log.info("Downloaded & resized -> %s", out_path)
+        start_downloads()
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, job, validators = in_flight.pop(future)
+                url, _, out_path, _, _, _ = job
+                try:
+                    value = future.result()
                 except subprocess.CalledProcessError as e:
                     log.error("ImageMagick failed for %s : %s", url, e)
-                    # Cleanup temps
-                    for p in (tmp_part, src_path, tmp_resized):
-                        try:
-                            if os.path.exists(p):
-                                os.remove(p)
-                        except OSError:
-                            pass
-                    # Do not update DB on failure; continue
+                    progress.tick(ok=False)
                     continue
                 except Exception as e:
                     log.error("Failed processing %s : %s", url, e)
-                    # Cleanup temps
-                    for p in (tmp_part, src_path, tmp_resized):
-                        try:
-                            if os.path.exists(p):
-                                os.remove(p)
-                        except OSError:
-                            pass
+                    progress.tick(ok=False)
                     continue
-                finally:
-                    # Remove the source copy if it remains
-                    try:
-                        if os.path.exists(src_path):
-                            os.remove(src_path)
-                    except OSError:
-                        pass
-            else:
-                log.info("Exists, skipping download: %s", out_path)
+                if stage == "download":
+                    src_path, validators = value
+                    start_resize(job, src_path, validators)
+                    if src_path:
+                        downloaded.add(url)
+                else:
+                    if url in downloaded:
+                        downloaded.discard(url)
+                        log.info("Downloaded & resized -> %s", out_path)
+                    progress.tick(ok=write(url, value, validators))
+            start_downloads()
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Download, resize and register the question images.")
+    p.add_argument("--pipelined", action="store_true",
+                   help="download, resize and write concurrently instead of one URL at a time")
+    p.add_argument("--download-workers", type=int, default=8, help="parallel downloads (pipelined mode)")
+    p.add_argument("--resize-workers", type=int, default=os.cpu_count() or 2,
+                   help="parallel ImageMagick processes (pipelined mode)")
+    p.add_argument("--url-file", help="read image URLs from this file (one per line) instead of MySQL; "
+                                      "no DB updates are made, handy against a local HTTP server")
+    p.add_argument("--revalidate", action="store_true",
+                   help="also send conditional requests (ETag/Last-Modified) for images that look "
+                        "current, and rebuild the ones that changed at the source")
+    p.add_argument("--reconcile", action="store_true",
+                   help="compare the image folders with questions.filename instead of syncing: report "
+                        "orphaned files and mark questions with a missing or corrupt image unplayable")
+    p.add_argument("--gc", action="store_true", help="with --reconcile, delete the orphaned files")
+    p.add_argument("--backend", choices=["auto", *BACKENDS], default="auto",
+                   help="image engine: ImageMagick subprocess or in-process Pillow (auto: magick if installed)")
+    p.add_argument("--benchmark", nargs="*", metavar="IMAGE",
+                   help="time the 720p resize with every available backend on these images "
+                        "(default: up to 20 files from the images folder) and exit")
+    return p.parse_args(argv)
+
+def benchmark(paths):
+    # Same inputs through each backend; report time per image and how far the outputs are apart
+    engines = []
+    for name in BACKENDS:
+        try:
+            engines.append(get_backend(name))
+        except RuntimeError as e:
+            log.warning("Skipping %s backend: %s", name, e)
+    if not paths:
+        names = sorted(n for n in os.listdir(IMAGES_DIR) if n.lower().endswith((".jpg", ".jpeg")))
+        paths = [os.path.join(IMAGES_DIR, n) for n in names[:20]]
+    if not engines or not paths:
+        log.error("Nothing to benchmark (backends: %d, images: %d).", len(engines), len(paths))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        for engine in engines:
+            start = time.perf_counter()
+            for i, path in enumerate(paths):
+                dst = os.path.join(tmp, f"{engine.name}-{i}{os.path.splitext(path)[1]}")
+                engine.resize_to_height(path, dst, MASTER_HEIGHT, MASTER_QUALITY)
+            elapsed = time.perf_counter() - start
+            outputs[engine.name] = [os.path.join(tmp, f"{engine.name}-{i}{os.path.splitext(p)[1]}")
+                                    for i, p in enumerate(paths)]
+            size = sum(os.path.getsize(p) for p in outputs[engine.name])
+            log.info("%-7s %6.1f ms/image, %5.1f KB/image average over %d images", engine.name,
+                     1000 * elapsed / len(paths), size / 1024 / len(paths), len(paths))
+        if "magick" in outputs and "pillow" in outputs:
+            Image = get_backend("pillow").Image
+            from PIL import ImageChops, ImageStat
+            diffs, mismatched = [], 0
+            for a, b in zip(outputs["magick"], outputs["pillow"]):
+                with Image.open(a) as ia, Image.open(b) as ib:
+                    if ia.size != ib.size:
+                        mismatched += 1
+                        continue
+                    diff = ImageStat.Stat(ImageChops.difference(ia.convert("RGB"), ib.convert("RGB")))
+                    diffs.append(sum(diff.mean) / 3)
+            log.info("magick vs pillow: %d size mismatches, mean abs pixel difference %.2f/255",
+                     mismatched, sum(diffs) / len(diffs) if diffs else 0)
+
+# ---------- Reconcile ----------
+def reconcile(cnx, manifest: dict, backend: str, gc: bool = False):
+    # Set differences between what's on disk and what questions refers to. Masters the
+    # manifest already vouches for (same size/mtime) aren't decoded again.
+    masters, variants, thumbs = scan_dir(IMAGES_DIR), scan_dir(VARIANTS_DIR), scan_dir(THUMBS_DIR)
+    masters.pop(os.path.basename(MANIFEST_PATH), None)
 
-            # Update DB: set filename for every row with this URL (even if file already existed)
+    flags = {}   # filename -> {playable values over its rows}
+    with cnx.cursor(pymysql.cursors.SSCursor) as cur:
+        cur.execute("SELECT filename, playable FROM questions WHERE filename IS NOT NULL AND filename <> ''")
+        while True:
+            rows = cur.fetchmany(1000)
+            if not rows:
+                break
+            for filename, playable in rows:
+                flags.setdefault(filename, set()).add(playable)
+    referenced = flags.keys()
+
+    keep_variants = {variant_name(f, w, fmt) for f in referenced for fmt in VARIANT_FORMATS for w in VARIANT_WIDTHS}
+    keep_thumbs = {thumb_name(f) for f in referenced}
+    orphans = [(os.path.join(IMAGES_DIR, n), masters[n][0]) for n in masters.keys() - referenced]
+    orphans += [(os.path.join(VARIANTS_DIR, n), variants[n][0]) for n in variants.keys() - keep_variants]
+    orphans += [(os.path.join(THUMBS_DIR, n), thumbs[n][0]) for n in thumbs.keys() - keep_thumbs]
+
+    present = {n for n, (size, _) in masters.items() if size > 0}
+    missing = referenced - present
+    trusted = {e["filename"]: (e.get("size"), e.get("mtime_ns")) for e in manifest.values()}
+    corrupt = set()
+    engine = get_backend(backend)
+    for name in referenced & present:
+        if masters[name] == trusted.get(name):
+            continue
+        try:
+            engine.check(os.path.join(IMAGES_DIR, name))
+        except Exception as e:
+            log.warning("Corrupt image %s : %s", name, e)
+            corrupt.add(name)
+
+    log.info("%d files on disk, %d filenames in questions: %d orphaned files (%.1f MB), %d missing, %d corrupt.",
+             len(masters) + len(variants) + len(thumbs), len(referenced), len(orphans),
+             sum(size for _, size in orphans) / 1e6, len(missing), len(corrupt))
+    for name in sorted(missing)[:20]:
+        log.info("Missing: %s", name)
+    if gc:
+        for path, _ in orphans:
+            remove_quietly(path)
+        for url in [url for url, e in manifest.items() if e.get("filename") not in referenced]:
+            del manifest[url]
+        log.info("Deleted %d orphaned files.", len(orphans))
+    else:
+        for path, _ in sorted(orphans)[:20]:
+            log.info("Orphan: %s", path)
+
+    # Only rows whose flag actually changes are written, in one transaction
+    unplayable = missing | corrupt
+    disable = [(f,) for f in unplayable if flags[f] != {0}]
+    enable = [(f,) for f in referenced - unplayable if flags[f] != {1}]
+    with cnx.cursor() as cur:
+        try:
+            cur.executemany("UPDATE questions SET playable=0 WHERE filename=%s", disable)
+            cur.executemany("UPDATE questions SET playable=1 WHERE filename=%s", enable)
+            cnx.commit()
+        except Exception as e:
+            cnx.rollback()
+            log.error("DB update failed : %s", e)
+            return
+    log.info("Marked %d filenames unplayable, %d playable again.", len(disable), len(enable))
+
+# db_values(entry) + (url,)
+UPDATE_QUESTION_IMAGE = "UPDATE questions SET filename=%s, variants=%s, placeholder=%s, color=%s, playable=%s WHERE url=%s"
+
+def apply_updates(cnx, cur, updates) -> bool:
+    # All changed URLs in one transaction, sent in executemany batches. If that fails on a row
+    # (e.g. a value the column rejects), the URLs go again one by one and only the bad ones are skipped.
+    if not updates:
+        log.info("Database already up to date.")
+        return True
+    try:
+        for i in range(0, len(updates), DB_BATCH_SIZE):
+            cur.executemany(UPDATE_QUESTION_IMAGE, updates[i:i + DB_BATCH_SIZE])
+        cnx.commit()
+    except pymysql.OperationalError as e:
+        cnx.rollback()
+        log.error("DB update failed, rolled back %d URLs (the next run retries them) : %s", len(updates), e)
+        return False
+    except pymysql.MySQLError as e:
+        cnx.rollback()
+        log.warning("DB update batch failed, updating URLs one by one : %s", e)
+        return apply_updates_one_by_one(cnx, cur, updates)
+    log.info("Updated %d URLs in one transaction.", len(updates))
+    return True
+
+def apply_updates_one_by_one(cnx, cur, updates) -> bool:
+    # A failed statement only undoes itself, so the good rows still commit together. Connection
+    # trouble or a deadlock (OperationalError) ends the transaction, so that rolls back everything.
+    skipped = 0
+    try:
+        for values in updates:
             try:
-                cur.execute("UPDATE questions SET filename=%s WHERE url=%s", (fname, url))
-                cnx.commit()
-            except Exception as e:
-                cnx.rollback()
-                log.error("DB update failed for %s : %s", url, e)
-                continue
-
-            processed += 1
-            if processed % 25 == 0 or processed == total:
-                log.info("Progress: %d/%d URLs processed", processed, total)
-
-    log.info("Done.")
+                cur.execute(UPDATE_QUESTION_IMAGE, values)
+            except pymysql.OperationalError:
+                raise
+            except pymysql.MySQLError as e:
+                skipped += 1
+                log.error("DB update failed, skipping %s : %s", values[-1], e)
+        cnx.commit()
+    except pymysql.OperationalError as e:
+        cnx.rollback()
+        log.error("DB update failed, rolled back %d URLs (the next run retries them) : %s", len(updates), e)
+        return False
+    log.info("Updated %d URLs, skipped %d.", len(updates) - skipped, skipped)
+    return True
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.benchmark is not None:
+        benchmark(args.benchmark)
+        return
+    started = time.perf_counter()
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    os.makedirs(THUMBS_DIR, exist_ok=True)
+    manifest = load_manifest()
+
+    if args.url_file:
+        with open(args.url_file, encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip()]
+        try:
+            run(urls, manifest, {}, lambda url, entry: True, args)
+        finally:
+            save_manifest(manifest)
+        log.info("Done in %.2fs.", time.perf_counter() - started)
+        return
+
+    if args.reconcile:
+        with connect() as cnx:
+            with cnx.cursor() as cur:
+                ensure_columns(cur)
+            try:
+                reconcile(cnx, manifest, args.backend, args.gc)
+            finally:
+                save_manifest(manifest)
+        log.info("Done in %.2fs.", time.perf_counter() - started)
+        return
+
+    with connect() as cnx, cnx.cursor() as cur:
+        ensure_columns(cur)
+        cur.execute("SELECT url, filename, variants, placeholder, color, playable FROM questions "
+                    "WHERE url IS NOT NULL AND url <> ''")
+        stored = {}   # url -> {(filename, variants, placeholder, color, playable), ...} over its rows
+        for url, *values in cur.fetchall():
+            stored.setdefault(url, set()).add(tuple(values))
+        urls = list(stored)
+        placeholders = {url: (p, c) for url, rows in stored.items() for _, _, p, c, _ in rows if p and c}
+        updates = []
+
+        def write(url, entry):
+            # Queue an update only when some row with this URL differs from the manifest
+            values = db_values(entry)
+            if stored[url] != {values}:
+                updates.append(values + (url,))
+            return True
+
+        try:
+            run(urls, manifest, placeholders, write, args)
+        finally:
+            save_manifest(manifest)
+        apply_updates(cnx, cur, updates)
+
+    log.info("Done in %.2fs.", time.perf_counter() - started)
+
+def run(urls, manifest, placeholders, write, args):
+    jobs, current = plan_jobs(urls, manifest, placeholders, args.revalidate)
+    log.info("Found %d unique URLs: %d up to date, %d to process.", len(current) + len(jobs), len(current), len(jobs))
+    for url in current:
+        write(url, manifest[url])
+    if not jobs:
+        return
+
+    def record(url, result, validators):
+        manifest[url] = manifest_entry(result, validators, manifest.get(url), placeholders.get(url, (None, None)))
+        return write(url, manifest[url])
+
+    try:
+        log.info("Image backend: %s", get_backend(args.backend).name)
+    except RuntimeError as e:
+        log.error("%s", e)
+        sys.exit(1)
+    progress = Progress(len(jobs))
+    if args.pipelined:
+        log.info("Pipelined mode: %d download workers, %d resize workers.",
+                 args.download_workers, args.resize_workers)
+        run_pipelined(jobs, record, progress, args.backend, max(1, args.download_workers), max(1, args.resize_workers))
+    else:
+        run_sequential(jobs, record, progress, args.backend)
 
 if __name__ == "__main__":
     main()
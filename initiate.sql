@@ -2,9 +2,16 @@ CREATE TABLE IF NOT EXISTS leaderboard (
     id INT AUTO_INCREMENT PRIMARY KEY,
     player_name VARCHAR(50) NOT NULL,
     score INT NOT NULL,
-    played_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    played_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_score (score, id),
+    KEY idx_played_on_score (played_on, score)
 );
 
+-- Existing installs: add the leaderboard indexes once
+-- ALTER TABLE leaderboard
+--   ADD KEY idx_score (score, id),
+--   ADD KEY idx_played_on_score (played_on, score);
+
 -- Create table
 CREATE TABLE IF NOT EXISTS `questions` (
   `tmdbid`   INT NOT NULL,
@@ -12,8 +19,14 @@ CREATE TABLE IF NOT EXISTS `questions` (
   `title`    VARCHAR(255) NOT NULL,
   `url`      VARCHAR(512) NOT NULL,
   `filename` VARCHAR(255) NULL,
+  `variants` VARCHAR(255) NULL,          -- JSON widths per format, set by fetch-images.py
+  `placeholder` VARCHAR(2048) NULL,      -- base64 blur-up JPEG, set by fetch-images.py
+  `color` CHAR(7) NULL,                  -- average color '#rrggbb', set by fetch-images.py
+  `playable` TINYINT(1) NOT NULL DEFAULT 1, -- 0 when the image is missing/corrupt (fetch-images.py --reconcile)
   PRIMARY KEY (`tmdbid`,`type`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+-- Existing installs: the app (storage.py ensure_schema) and fetch-images.py (ensure_columns)
+-- add missing questions columns themselves
 
 -- Populate from MOVIES: best NULL-language backdrop per title
 INSERT INTO `questions` (tmdbid, `type`, title, url, filename)
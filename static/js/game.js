@@ -26,8 +26,10 @@ document.addEventListener('DOMContentLoaded', () => {
         timeLeft: document.getElementById('time-left'),
         currentScore: document.getElementById('current-score'),
         finalScore: document.getElementById('final-score'),
+        finalRank: document.getElementById('final-rank'),
         exitScore: document.getElementById('exit-score'),
         questionImage: document.getElementById('question-image'),
+        questionPicture: document.getElementById('question-picture'),
         answerGrid: document.getElementById('answer-grid'),
         feedbackMessage: document.getElementById('feedback-message'),
         summaryDetails: document.getElementById('summary-details'),
@@ -40,13 +42,24 @@ document.addEventListener('DOMContentLoaded', () => {
         welcomeDuration: document.getElementById('welcome-duration'),
     };
 
+    // Rendered width of #question-image: full width, or 16:9 of its 50vh max height
+    const IMAGE_SIZES = '(max-aspect-ratio: 16/9) 100vw, 89vh';
+    // Displayed height of one summary thumbnail (see .summary-thumb in style.css)
+    const SUMMARY_THUMB_HEIGHT = 54;
+
     // --- 2. Game State Variables ---
     let score = 0;
     let timeLeft = 0;
     let timerInterval = null;
     let correctStreak = 0;
     let seenQuestionIds = [];
+    let gameToken = null;
+    let gameGeneration = 0;
+    let questionQueue = [];
+    let refillPromise = null;
+    let deckExhausted = false;
     let currentCorrectAnswer = '';
+    let currentQuestion = null;
     let penaltyPoints = 0;
     let cheatsUsed = 0;
     let gameHistory = {};
@@ -151,6 +164,10 @@ document.addEventListener('DOMContentLoaded', () => {
         timeLeft = config.gameDuration;
         correctStreak = 0;
         seenQuestionIds = [];
+        gameGeneration++;
+        questionQueue = [];
+        refillPromise = null;
+        deckExhausted = false;
         penaltyPoints = 0;
         cheatsUsed = 0;
         gameHistory = {};
@@ -159,10 +176,23 @@ document.addEventListener('DOMContentLoaded', () => {
         displays.timeLeft.textContent = timeLeft;
         timerInterval = setInterval(updateTimer, 1000);
         playSound(sounds.start);
-        fetchNewQuestion();
+        startSession().then(fetchNewQuestion);
         switchScreen('game');
     }
 
+    async function startSession() {
+        // The server deals from a shuffled deck per game; without a token we fall back to seen_ids
+        gameToken = null;
+        try {
+            const response = await fetch('/start_game', { method: 'POST' });
+            if (!response.ok) throw new Error(`Server error: ${response.statusText}`);
+            const data = await response.json();
+            gameToken = data.session;
+        } catch (error) {
+            console.error("Failed to start game session:", error);
+        }
+    }
+
     function updateTimer() {
         timeLeft--;
         displays.timeLeft.textContent = timeLeft;
@@ -173,7 +203,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     async function fetchAndDisplayLeaderboard() {
         try {
-            const response = await fetch(`/get_leaderboard?limit=${config.leaderboardEntries}`);
+            const response = await fetch(`/get_leaderboard?limit=${config.leaderboardEntries}&period=${config.leaderboardPeriod || 'all'}`);
             leaderboardData = await response.json();
             const renderTarget = (listElement) => {
                 listElement.innerHTML = '';
@@ -197,20 +227,62 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function refillQueue() {
+        // Keeps a few questions (and their images) ready so answering never waits on the network
+        const wanted = (config.questionLookahead || 3) - questionQueue.length;
+        if (refillPromise || deckExhausted || wanted <= 0) return refillPromise || Promise.resolve();
+        const generation = gameGeneration;
+        const token = gameToken;
+        const params = () => gameToken
+            ? `session=${encodeURIComponent(gameToken)}`
+            : `seen_ids=${seenQuestionIds.concat(questionQueue.map(q => q.id)).join(',')}`;
+        const promise = (async () => {
+            try {
+                let response = await fetch(`/get_questions?count=${wanted}&${params()}`);
+                if (response.status === 404 && token && gameToken === token) {
+                    // The session expired, or this request reached a worker that doesn't hold it
+                    // (sessions live in one server process): carry on with seen_ids instead
+                    gameToken = null;
+                    response = await fetch(`/get_questions?count=${wanted}&${params()}`);
+                }
+                if (!response.ok) throw new Error(`Server error: ${response.statusText}`);
+                const data = await response.json();
+                if (data.error) throw new Error(data.error);
+                if (generation !== gameGeneration) return;
+                if (data.questions.length === 0) deckExhausted = true;
+                data.questions.forEach(question => {
+                    // A detached <picture> makes the browser pick (and cache) the same variant it will render
+                    question.preload = document.createElement('picture');
+                    question.preload.appendChild(new Image());
+                    setPictureSources(question.preload, question);
+                    questionQueue.push(question);
+                });
+            } finally {
+                if (refillPromise === promise) refillPromise = null;
+            }
+        })();
+        refillPromise = promise;
+        return promise;
+    }
+
     async function fetchNewQuestion() {
         isInputPaused = true;
         try {
-            const response = await fetch(`/get_question?seen_ids=${seenQuestionIds.join(',')}`);
-            if (!response.ok) throw new Error(`Server error: ${response.statusText}`);
-            const data = await response.json();
-            if (data.error) {
-                if (data.error === "No more questions available") endGame();
-                throw new Error(data.error);
+            if (questionQueue.length === 0) await refillQueue();
+            const data = questionQueue.shift();
+            if (!data) {
+                endGame();
+                throw new Error("No more questions available");
             }
             seenQuestionIds.push(data.id);
             currentCorrectAnswer = data.correct_answer;
-            gameHistory[data.id] = { correctAnswer: data.correct_answer, tries: 0, answeredCorrectly: false };
+            currentQuestion = data;
+            gameHistory[data.id] = {
+                correctAnswer: data.correct_answer, tries: 0, answeredCorrectly: false,
+                slot: data.slot, thumb: data.thumb,
+            };
             renderQuestion(data);
+            refillQueue().catch(error => console.error("Failed to prefetch questions:", error));
         } catch (error) {
             console.error("Failed to fetch question:", error);
             displays.answerGrid.innerHTML = `<p style="color: var(--accent-color);">Error: ${error.message}</p>`;
@@ -219,8 +291,39 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function setPictureSources(picture, question) {
+        // <source> per format (AVIF, WebP) with a width ladder; the <img> src is the 720p JPEG fallback
+        const img = picture.querySelector('img');
+        picture.querySelectorAll('source').forEach(source => source.remove());
+        (question.sources || []).forEach(({ type, srcset }) => {
+            const source = document.createElement('source');
+            source.type = type;
+            source.srcset = srcset;
+            source.sizes = IMAGE_SIZES;
+            picture.insertBefore(source, img);
+        });
+        img.src = question.visual;
+    }
+
     function renderQuestion(data) {
-        displays.questionImage.src = data.visual;
+        // Paint the blur-up placeholder right away, then swap in the real image once it has loaded
+        const image = displays.questionImage;
+        image.style.backgroundColor = data.color || '';
+        const loader = data.preload ? data.preload.querySelector('img') : null;
+        if (data.placeholder && loader && !(loader.complete && loader.naturalWidth)) {
+            setPictureSources(displays.questionPicture, { visual: data.placeholder });
+            image.classList.add('placeholder');
+            const swapIn = () => {
+                if (currentQuestion !== data) return;  // already moved on
+                setPictureSources(displays.questionPicture, data);
+                image.classList.remove('placeholder');
+            };
+            loader.addEventListener('load', swapIn, { once: true });
+            loader.addEventListener('error', swapIn, { once: true });
+        } else {
+            image.classList.remove('placeholder');
+            setPictureSources(displays.questionPicture, data);
+        }
         displays.answerGrid.innerHTML = '';
         data.answers.forEach(answer => {
             const button = document.createElement('button');
@@ -312,9 +415,24 @@ document.addEventListener('DOMContentLoaded', () => {
         checkLeaderboardEligibility(finalScoreValue);
     }
 
-    function checkLeaderboardEligibility(currentScore) {
-        const lowestScore = leaderboardData.length < config.leaderboardEntries ? 0 : leaderboardData[leaderboardData.length - 1].score;
-        if (currentScore > 0 && currentScore >= lowestScore) {
+    async function checkLeaderboardEligibility(currentScore) {
+        let qualifies;
+        displays.finalRank.textContent = '';
+        try {
+            const response = await fetch(`/rank?score=${currentScore}&limit=${config.leaderboardEntries}&period=${config.leaderboardPeriod || 'all'}`);
+            if (!response.ok) throw new Error(`Server error: ${response.statusText}`);
+            const data = await response.json();
+            qualifies = data.qualifies;
+            if (currentScore > 0) {
+                displays.finalRank.textContent = `You placed #${data.rank.toLocaleString()} of ${(data.total + 1).toLocaleString()}`;
+            }
+        } catch (error) {
+            // Fall back to the (possibly stale) leaderboard we already have
+            console.error("Failed to fetch rank:", error);
+            const lowestScore = leaderboardData.length < config.leaderboardEntries ? 0 : leaderboardData[leaderboardData.length - 1].score;
+            qualifies = currentScore > 0 && currentScore >= lowestScore;
+        }
+        if (qualifies) {
             displays.playerNameInput.value = '';
             buttons.saveScore.disabled = false;
             buttons.saveScore.textContent = 'Save to Hall of Fame';
@@ -346,14 +464,33 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
+        const thumbs = [];
         attemptedQuestionIds.forEach(id => {
             const item = gameHistory[id];
             const resultIcon = item.answeredCorrectly ? '✅' : '❌';
             const triesText = item.tries === 1 ? '1 try' : `${item.tries} tries`;
             const summaryItem = document.createElement('div');
-            summaryItem.innerHTML = `${resultIcon} <strong>${item.correctAnswer}</strong> (${triesText})`;
+            summaryItem.className = 'summary-item';
+            summaryItem.innerHTML = `<span class="summary-thumb"></span>${resultIcon} <strong>${item.correctAnswer}</strong> (${triesText})`;
             displays.summaryDetails.appendChild(summaryItem);
+            thumbs.push([summaryItem.querySelector('.summary-thumb'), item]);
+        });
+        loadSummaryThumbs(thumbs);
+    }
+
+    function loadSummaryThumbs(thumbs) {
+        // One sprite request for the whole game; single thumbnails only if the sprite isn't available
+        const useSingleThumbs = () => thumbs.forEach(([thumb, item]) => {
+            if (item.thumb) thumb.style.backgroundImage = `url(${item.thumb})`;
+        });
+        if (!gameToken || thumbs.some(([, item]) => item.slot === undefined)) return useSingleThumbs();
+        const sprite = new Image();
+        sprite.onload = () => thumbs.forEach(([thumb, item]) => {
+            thumb.style.backgroundImage = `url(${sprite.src})`;
+            thumb.style.backgroundPosition = `0 ${-item.slot * SUMMARY_THUMB_HEIGHT}px`;
         });
+        sprite.onerror = useSingleThumbs;
+        sprite.src = `/summary_sprite?session=${encodeURIComponent(gameToken)}`;
     }
 
     async function saveScore() {
@@ -0,0 +1,614 @@
+"""Storage backends for the game's question catalog and leaderboard.
+
+MySQLStorage talks to the MySQL server through a connection pool (production).
+SQLiteStorage keeps both tables in one local file, so reads never leave the
+process and the app starts without a database server. Build that file from a
+MySQL export with:
+
+    python storage.py import-dump Resources/exportforweb.sql
+
+STORAGE_BACKEND=mysql|sqlite picks the backend per deployment (SQLITE_PATH
+says where the SQLite file lives). Both raise StorageError, and
+StorageUnavailable when it is worth retrying later.
+"""
+import os
+import re
+import sys
+import time
+import sqlite3
+import zlib
+import argparse
+import datetime
+import threading
+from contextlib import contextmanager
+import pymysql.cursors
+
+# --- Configuration ---
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mysql')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thegame.sqlite'))
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST'),
+    'user': os.environ.get('DB_USER'),
+    'password': os.environ.get('DB_PASSWORD'),
+    'database': 'thegame',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+# Opening a connection to the remote MySQL host (TCP + auth handshake) costs
+# more than the queries themselves, so every route borrows from one shared pool.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_POOL_TIMEOUT = 10         # seconds to wait for a free connection
+DB_POOL_RECYCLE = 280        # reconnect before the server's idle wait_timeout kicks in
+DB_POOL_PING_AFTER = 30      # ping connections that sat idle longer than this
+
+# --- Queries (pymysql paramstyle; SQLiteStorage swaps %s for ?) ---
+PLAYABLE = "filename IS NOT NULL AND filename <> '' AND playable = 1"
+QUESTIONS_SQL = f"SELECT tmdbid, type, title, filename, variants, placeholder, color FROM questions WHERE {PLAYABLE}"
+# Changes whenever a playable question is added, removed or edited; a scan of a few hundred rows
+CATALOG_VERSION_SQL = (
+    "SELECT COUNT(*) AS count, COALESCE(SUM(CRC32(CONCAT_WS('|', tmdbid, type, title, filename, "
+    f"variants, placeholder, color))), 0) AS checksum FROM questions WHERE {PLAYABLE}"
+)
+TOP_SCORES_SQL = "SELECT player_name, score FROM leaderboard ORDER BY score DESC, id LIMIT %s"
+# Range on idx_played_on_score, then a small sort of that window
+TOP_SCORES_SINCE_SQL = ("SELECT player_name, score FROM leaderboard WHERE played_on >= %s "
+                        "ORDER BY score DESC, id LIMIT %s")
+# Newest score id (primary key, so one index dive); moves whenever any process adds a score
+LEADERBOARD_VERSION_SQL = "SELECT COALESCE(MAX(id), 0) AS version FROM leaderboard"
+HISTOGRAM_SQL = "SELECT score, COUNT(*) AS count FROM leaderboard GROUP BY score"
+INSERT_SCORE_SQL = "INSERT INTO leaderboard (player_name, score, played_on) VALUES (%s, %s, %s)"
+
+# Columns the queries above read that were added to questions after it was first created:
+# name -> (MySQL definition, SQLite definition). Added to older tables on first use.
+QUESTION_COLUMNS = {
+    'variants': ("VARCHAR(255) NULL", "TEXT"),
+    'placeholder': ("VARCHAR(2048) NULL", "TEXT"),
+    'color': ("CHAR(7) NULL", "TEXT"),
+    'playable': ("TINYINT(1) NOT NULL DEFAULT 1", "INTEGER NOT NULL DEFAULT 1"),
+}
+# MySQL columns an older version created too narrow: name -> minimum length
+WIDENED_COLUMNS = {'placeholder': 2048}
+QUESTION_COLUMNS_SQL = ("SELECT COLUMN_NAME AS name, CHARACTER_MAXIMUM_LENGTH AS length FROM information_schema.COLUMNS "
+                        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'questions'")
+
+
+class StorageError(Exception):
+    """A query failed."""
+
+
+class StorageUnavailable(StorageError):
+    """The database could not be reached (or was busy); retrying later may work."""
+
+
+# --- MySQL ---
+class PoolTimeout(pymysql.OperationalError):
+    """No connection became free within DB_POOL_TIMEOUT seconds."""
+
+
+# Guards the post-fork resets of ConnectionPool and SQLiteStorage; replaced in the child
+# so a copy held by another thread at fork time can't deadlock it
+_fork_lock = threading.Lock()
+
+
+def _new_fork_lock():
+    global _fork_lock
+    _fork_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_new_fork_lock)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of pymysql connections with health checks."""
+
+    def __init__(self, config, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 recycle=DB_POOL_RECYCLE, ping_after=DB_POOL_PING_AFTER):
+        self.config = config
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._idle = []          # (connection, created_at, last_used)
+        self._size = 0           # idle + checked out
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        self._stats = dict(checkouts=0, waits=0, timeouts=0, created=0,
+                           recycled=0, health_check_failures=0, wait_seconds=0.0)
+
+    def _connect(self):
+        # autocommit so a reused connection never reads from a stale snapshot
+        connection = pymysql.connect(autocommit=True, **self.config)
+        with self._cond:
+            self._stats['created'] += 1
+        return connection, time.monotonic()
+
+    def acquire(self):
+        """Check out a healthy connection, opening or waiting for one as needed.
+
+        Returns (connection, created_at); hand both back via release().
+        """
+        if self._pid != os.getpid():
+            self._after_fork()
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self._stats['checkouts'] += 1
+            waited_since = None
+            while not self._idle and self._size >= self.max_size:
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout("Timed out waiting for a database connection")
+                self._cond.wait(remaining)
+            if waited_since is not None:
+                self._stats['wait_seconds'] += time.monotonic() - waited_since
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                self._size += 1
+
+        try:
+            if entry is None:
+                return self._connect()
+            connection, created_at, last_used = entry
+            now = time.monotonic()
+            if now - created_at > self.recycle:
+                self._close_quietly(connection)
+                with self._cond:
+                    self._stats['recycled'] += 1
+                return self._connect()
+            if now - last_used > self.ping_after:
+                try:
+                    connection.ping(reconnect=False)
+                except pymysql.MySQLError:
+                    self._close_quietly(connection)
+                    with self._cond:
+                        self._stats['health_check_failures'] += 1
+                    return self._connect()
+            return connection, created_at
+        except BaseException:
+            # Couldn't hand out a connection: give the slot back
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _after_fork(self):
+        # A forked worker (uWSGI, gunicorn --preload) inherits the parent's sockets, e.g. the
+        # one warm_caches() used at import. Sharing them interleaves MySQL packets, so this
+        # process forgets them without closing (a COM_QUIT would end the parent's session too)
+        # and starts with an empty pool of its own.
+        with _fork_lock:
+            if self._pid == os.getpid():
+                return   # another thread got here first
+            self._cond = threading.Condition()
+            self._idle = []
+            self._size = 0
+            self._pid = os.getpid()
+
+    def release(self, connection, created_at, broken=False):
+        """Return a connection to the pool, or drop it if it is broken."""
+        if self._pid != os.getpid():
+            return   # borrowed before a fork: not ours to keep
+        if broken or not connection.open:
+            self._close_quietly(connection)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((connection, created_at, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """`with pool.connection() as connection:` borrows a connection for the block."""
+        connection, created_at = self.acquire()
+        broken = False
+        try:
+            yield connection
+        except (pymysql.OperationalError, pymysql.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(connection, created_at, broken)
+
+    def metrics(self):
+        with self._cond:
+            idle = len(self._idle)
+            return dict(self._stats, size=self._size, idle=idle,
+                        in_use=self._size - idle, max_size=self.max_size)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+class MySQLStorage:
+    """Catalog and leaderboard in MySQL, through a ConnectionPool."""
+
+    name = 'mysql'
+
+    def __init__(self, config=DB_CONFIG, pool_size=DB_POOL_SIZE):
+        self.pool = ConnectionPool(config, max_size=pool_size)
+        self._schema_checked = False
+        self._schema_lock = threading.Lock()
+
+    @contextmanager
+    def cursor(self):
+        """Borrow a pooled connection; pymysql errors come out as StorageError."""
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                yield connection, cursor
+        except (pymysql.OperationalError, pymysql.InterfaceError) as e:
+            raise StorageUnavailable(str(e)) from e
+        except pymysql.MySQLError as e:
+            raise StorageError(str(e)) from e
+
+    def ensure_schema(self):
+        """Add the QUESTION_COLUMNS an older questions table lacks; checked once per process."""
+        if self._schema_checked:
+            return
+        with self._schema_lock, self.cursor() as (connection, cursor):
+            if self._schema_checked:
+                return
+            cursor.execute(QUESTION_COLUMNS_SQL)
+            existing = {row['name'].lower(): row['length'] for row in cursor.fetchall()}
+            if existing:
+                for name, (definition, _) in QUESTION_COLUMNS.items():
+                    if name not in existing:
+                        self._alter(cursor, f"ALTER TABLE questions ADD COLUMN `{name}` {definition}")
+                    elif (existing[name] or 0) < WIDENED_COLUMNS.get(name, 0):
+                        self._alter(cursor, f"ALTER TABLE questions MODIFY COLUMN `{name}` {definition}")
+            self._schema_checked = True
+
+    @staticmethod
+    def _alter(cursor, sql):
+        try:
+            cursor.execute(sql)
+        except pymysql.MySQLError as e:
+            if e.args[0] != 1060:   # ER_DUP_FIELDNAME: another worker added it first
+                raise
+
+    def load_questions(self):
+        self.ensure_schema()
+        with self.cursor() as (connection, cursor):
+            cursor.execute(QUESTIONS_SQL)
+            return cursor.fetchall()
+
+    def catalog_version(self):
+        """'count:checksum' of the playable questions, to notice changes without reading them."""
+        self.ensure_schema()
+        with self.cursor() as (connection, cursor):
+            cursor.execute(CATALOG_VERSION_SQL)
+            row = cursor.fetchone()
+            return f"{row['count']}:{int(row['checksum']):x}"
+
+    def top_scores(self, limit, since=None):
+        """Best {player_name, score} rows, all-time or played on/after `since`."""
+        with self.cursor() as (connection, cursor):
+            if since is None:
+                cursor.execute(TOP_SCORES_SQL, (limit,))
+            else:
+                cursor.execute(TOP_SCORES_SINCE_SQL, (since, limit))
+            return cursor.fetchall()
+
+    def score_histogram(self):
+        """(score, count) for every distinct score."""
+        with self.cursor() as (connection, cursor):
+            cursor.execute(HISTOGRAM_SQL)
+            return [(row['score'], row['count']) for row in cursor.fetchall()]
+
+    def leaderboard_version(self):
+        """Id of the newest leaderboard row, to notice new scores without reading them."""
+        with self.cursor() as (connection, cursor):
+            cursor.execute(LEADERBOARD_VERSION_SQL)
+            return cursor.fetchone()['version']
+
+    def insert_scores(self, rows):
+        """INSERT (player_name, score, played_on) rows in one statement (pymysql makes executemany multi-row)."""
+        with self.cursor() as (connection, cursor):
+            cursor.executemany(INSERT_SCORE_SQL, rows)
+            connection.commit()
+
+    def metrics(self):
+        return self.pool.metrics()
+
+
+# --- SQLite ---
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+  tmdbid      INTEGER NOT NULL,
+  type        TEXT NOT NULL CHECK (type IN ('movie', 'tv')),
+  title       TEXT NOT NULL,
+  url         TEXT NOT NULL,
+  filename    TEXT,
+  variants    TEXT,
+  placeholder TEXT,
+  color       TEXT,
+  playable    INTEGER NOT NULL DEFAULT 1,
+  PRIMARY KEY (tmdbid, type)
+);
+CREATE TABLE IF NOT EXISTS leaderboard (
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  player_name TEXT NOT NULL,
+  score       INTEGER NOT NULL,
+  played_on   TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_score ON leaderboard (score, id);
+CREATE INDEX IF NOT EXISTS idx_played_on_score ON leaderboard (played_on, score);
+"""
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _concat_ws(separator, *values):
+    # MySQL's CONCAT_WS: NULLs are skipped, not turned into empty strings
+    return separator.join(str(value) for value in values if value is not None)
+
+
+def _crc32(value):
+    return None if value is None else zlib.crc32(str(value).encode('utf-8'))
+
+
+def _sqlite_value(value):
+    # played_on is stored as MySQL prints it ('YYYY-MM-DD HH:MM:SS'), so ranges compare as text
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+class SQLiteStorage:
+    """Catalog and leaderboard in a local SQLite file: no server, no network round trips."""
+
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        # One connection per process, shared under a lock: every query here takes
+        # microseconds and most reads are answered by the app's in-memory caches anyway.
+        # It is opened on first use, so workers forked after the import open their own.
+        self._connection = None
+        self._pid = None
+        self._inherited = []
+        self._lock = threading.Lock()
+        self._stats = dict(queries=0, errors=0)
+
+    def _connect(self):
+        with _fork_lock:
+            if self._pid == os.getpid():
+                return
+            if self._connection is not None:
+                # SQLite handles must not cross fork(); closing the parent's copy could
+                # checkpoint or remove its WAL, so it is kept open and never used again.
+                self._inherited.append(self._connection)
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            connection.row_factory = _dict_row
+            # The MySQL functions CATALOG_VERSION_SQL uses
+            connection.create_function('CONCAT_WS', -1, _concat_ws, deterministic=True)
+            connection.create_function('CRC32', 1, _crc32, deterministic=True)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SQLITE_SCHEMA)
+            self._add_columns(connection)
+            self._lock = threading.Lock()
+            self._connection = connection
+            self._pid = os.getpid()
+
+    @staticmethod
+    def _add_columns(connection):
+        # CREATE TABLE IF NOT EXISTS leaves an older questions table as it was
+        existing = {row['name'] for row in connection.execute("PRAGMA table_info(questions)")}
+        for name, (_, definition) in QUESTION_COLUMNS.items():
+            if name not in existing:
+                try:
+                    connection.execute(f"ALTER TABLE questions ADD COLUMN {name} {definition}")
+                except sqlite3.OperationalError as e:
+                    if 'duplicate column' not in str(e):   # another process added it first
+                        raise
+
+    @contextmanager
+    def cursor(self):
+        """Lock this process's connection; sqlite3 errors come out as StorageError."""
+        if self._pid != os.getpid():
+            try:
+                self._connect()
+            except sqlite3.Error as e:
+                raise StorageUnavailable(str(e)) from e
+        with self._lock:
+            self._stats['queries'] += 1
+            try:
+                yield self._connection.cursor()
+            except sqlite3.OperationalError as e:
+                self._stats['errors'] += 1
+                if 'locked' in str(e) or 'busy' in str(e):
+                    raise StorageUnavailable(str(e)) from e
+                raise StorageError(str(e)) from e
+            except sqlite3.Error as e:
+                self._stats['errors'] += 1
+                raise StorageError(str(e)) from e
+
+    @staticmethod
+    @contextmanager
+    def _transaction(cursor):
+        # COMMIT inside the try too: a failed (e.g. busy) COMMIT leaves the transaction open,
+        # and the shared connection would refuse every later BEGIN
+        cursor.execute("BEGIN")
+        try:
+            yield
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _sql(sql):
+        return sql.replace('%s', '?')
+
+    def load_questions(self):
+        with self.cursor() as cursor:
+            return cursor.execute(QUESTIONS_SQL).fetchall()
+
+    def catalog_version(self):
+        """'count:checksum' of the playable questions, to notice changes without reading them."""
+        with self.cursor() as cursor:
+            row = cursor.execute(CATALOG_VERSION_SQL).fetchone()
+            return f"{row['count']}:{int(row['checksum']):x}"
+
+    def top_scores(self, limit, since=None):
+        """Best {player_name, score} rows, all-time or played on/after `since`."""
+        with self.cursor() as cursor:
+            if since is None:
+                return cursor.execute(self._sql(TOP_SCORES_SQL), (limit,)).fetchall()
+            return cursor.execute(self._sql(TOP_SCORES_SINCE_SQL), (_sqlite_value(since), limit)).fetchall()
+
+    def score_histogram(self):
+        """(score, count) for every distinct score."""
+        with self.cursor() as cursor:
+            return [(row['score'], row['count']) for row in cursor.execute(HISTOGRAM_SQL)]
+
+    def leaderboard_version(self):
+        """Id of the newest leaderboard row, to notice new scores without reading them."""
+        with self.cursor() as cursor:
+            return cursor.execute(LEADERBOARD_VERSION_SQL).fetchone()['version']
+
+    def insert_scores(self, rows):
+        """INSERT (player_name, score, played_on) rows in one transaction."""
+        with self.cursor() as cursor:
+            with self._transaction(cursor):
+                cursor.executemany(self._sql(INSERT_SCORE_SQL),
+                                   [tuple(_sqlite_value(value) for value in row) for row in rows])
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats, path=self.path)
+
+    def import_rows(self, table, columns, rows):
+        """INSERT OR REPLACE rows into questions/leaderboard; columns this schema lacks are dropped."""
+        with self.cursor() as cursor:
+            known = {row['name'] for row in cursor.execute(f"PRAGMA table_info({table})")}
+            if not known:
+                return 0
+            keep = [i for i, column in enumerate(columns) if column in known]
+            names = ', '.join(columns[i] for i in keep)
+            placeholders = ', '.join('?' * len(keep))
+            with self._transaction(cursor):
+                cursor.executemany(f"INSERT OR REPLACE INTO {table} ({names}) VALUES ({placeholders})",
+                                   [tuple(row[i] for i in keep) for row in rows])
+            return len(rows)
+
+
+def open_storage(backend=None):
+    """The storage backend named by STORAGE_BACKEND (or `backend`)."""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'mysql':
+        return MySQLStorage()
+    if backend == 'sqlite':
+        return SQLiteStorage(SQLITE_PATH)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, use 'mysql' or 'sqlite'")
+
+
+# --- Dump import ---
+# Reads the INSERT statements of a mysqldump/HeidiSQL export such as
+# Resources/exportforweb.sql; everything else in the file is skipped. INSERTs
+# without a column list (mysqldump's default) take the column order of the
+# dump's CREATE TABLE for that table.
+INSERT_RE = re.compile(r"(?:INSERT(?:\s+IGNORE)?|REPLACE)\s+INTO\s+`?(\w+)`?\s*(?:\(([^)]*)\)\s*)?VALUES", re.IGNORECASE)
+CREATE_RE = re.compile(r"CREATE TABLE\s+(?:IF NOT EXISTS\s+)?`?(\w+)`?\s*\((.*?)\)\s*(?:ENGINE|;)", re.IGNORECASE | re.S)
+CREATE_COLUMN_RE = re.compile(r"^\s*`(\w+)`", re.M)
+VALUE_RE = re.compile(r"\s*(?:'((?:[^'\\]|\\.|'')*)'|(NULL)|(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?))\s*([,)])", re.S)
+SPACE_RE = re.compile(r"\s*")
+# The rest of an INSERT up to its closing ';', stepping over quoted strings
+STATEMENT_REST_RE = re.compile(r"(?:'(?:[^'\\]|\\.|'')*'|[^';])*;?", re.S)
+MYSQL_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+
+
+def _unescape(text):
+    text = text.replace("''", "'")
+    return re.sub(r"\\(.)", lambda m: MYSQL_ESCAPES.get(m.group(1), m.group(1)), text, flags=re.S)
+
+
+def parse_dump(text, tables=None):
+    """Yield (table, columns, rows) for every INSERT statement in a MySQL dump (only `tables`, if given)."""
+    pos = 0
+    table_columns = {}   # table -> column order from its CREATE TABLE
+    while True:
+        match = INSERT_RE.search(text, pos)
+        if match is None:
+            return
+        for create in CREATE_RE.finditer(text, pos, match.start()):
+            table_columns[create.group(1)] = CREATE_COLUMN_RE.findall(create.group(2))
+        table = match.group(1)
+        if tables is not None and table not in tables:
+            pos = STATEMENT_REST_RE.match(text, match.end()).end()
+            continue
+        if match.group(2) is not None:
+            columns = [column.strip().strip('`') for column in match.group(2).split(',')]
+        elif table in table_columns:
+            columns = table_columns[table]
+        else:
+            raise ValueError(f"INSERT INTO {table} has no column list and the dump has no CREATE TABLE "
+                             f"for it; export with --complete-insert")
+        pos, rows = match.end(), []
+        while True:
+            start = text.index('(', pos)
+            pos, row = start + 1, []
+            while True:
+                value = VALUE_RE.match(text, pos)
+                if value is None:
+                    raise ValueError(f"Can't parse the value at offset {pos} of {table}")
+                string, null, number, end = value.groups()
+                if string is not None:
+                    row.append(_unescape(string))
+                elif null:
+                    row.append(None)
+                else:
+                    row.append(float(number) if any(c in number for c in '.eE') else int(number))
+                pos = value.end()
+                if end == ')':
+                    break
+            if len(row) != len(columns):
+                raise ValueError(f"Row {len(rows) + 1} of an INSERT INTO {table} has {len(row)} values "
+                                 f"for {len(columns)} columns")
+            rows.append(row)
+            pos = SPACE_RE.match(text, pos).end()
+            if text.startswith(',', pos):
+                pos += 1
+                continue
+            break   # ';' ends the statement
+        yield table, columns, rows
+
+
+def import_dump(dump_path, sqlite_path=SQLITE_PATH):
+    """Load the questions and leaderboard rows of a MySQL dump into a SQLite file."""
+    storage = SQLiteStorage(sqlite_path)
+    with open(dump_path, encoding='utf-8') as f:
+        text = f.read()
+    counts = {}
+    for table, columns, rows in parse_dump(text, tables=('questions', 'leaderboard')):
+        counts[table] = counts.get(table, 0) + storage.import_rows(table, columns, rows)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Storage tools.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('import-dump', help="Load a MySQL export (questions, leaderboard) into the SQLite file.")
+    load.add_argument('dump', help="e.g. Resources/exportforweb.sql")
+    load.add_argument('--sqlite', default=SQLITE_PATH, help="SQLite file to fill (default: %(default)s)")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    try:
+        counts = import_dump(args.dump, args.sqlite)
+    except (OSError, ValueError, StorageError) as e:
+        sys.exit(f"Import failed: {e}")
+    for table, count in sorted(counts.items()):
+        print(f"{table}: {count} rows")
+    print(f"Imported into {args.sqlite} in {time.perf_counter() - started:.2f}s")